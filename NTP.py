@@ -7,13 +7,16 @@ NTP.py - NTP Management compatible with main.py
 
 import os
 import json
-import requests
-from bs4 import BeautifulSoup
+
+from luci_session import luci_sessions, input_value
+from bulk import run_bulk, BULK_MAX_WORKERS
 
 # ===========================
 # Configuration - Compatible with main.py
 # ===========================
 DEFAULT_NTP_SERVERS = ["ir.pool.ntp.org"]
+# how many miners are updated at the same time by bulk_super_ntp_update
+NTP_BULK_WORKERS = int(os.environ.get("NTP_BULK_WORKERS", BULK_MAX_WORKERS))
 
 def _get_miner_base(miner_name):
     """Get miner base URL - Compatible with main.py"""
@@ -33,80 +36,66 @@ def _get_miner_base(miner_name):
     except Exception as e:
         return None, None, f"Error: {str(e)}"
 
-def _session_noverify():
-    """Create session without verify - Compatible with main.py"""
-    s = requests.Session()
-    s.verify = False
-    requests.packages.urllib3.disable_warnings()
-    return s
-
 def login_to_miner(miner_name, username, password):
-    """Login to miner - Compatible with main.py"""
+    """Login to miner - returns (session, error); sessions are shared and reused"""
     base, port, err = _get_miner_base(miner_name)
     if err:
         return None, err
     
-    login_url = f"{base}/cgi-bin/luci"
-    session = _session_noverify()
-    
-    try:
-        # Initial GET to get cookies
-        session.get(login_url, timeout=10)
-    except Exception as e:
-        return None, f"GET login page failed: {e}"
-    
-    # Different payloads for compatibility
-    payloads = [
-        {"luci_username": username, "luci_password": password},
-        {"username": username, "password": password},
-    ]
-    
-    for payload in payloads:
-        try:
-            resp = session.post(login_url, data=payload, timeout=10, allow_redirects=False)
-            if resp.status_code in (200, 302, 303):
-                return session, None
-        except Exception as e:
-            continue
-    
-    return None, "Login failed with all payloads"
+    entry, err = luci_sessions.session(base, username, password)
+    if not entry:
+        return None, err
+    return entry.http, None
 
 def super_ntp_update(miner_name, enable_ntp=True, custom_servers=None, timezone="Asia/Tehran", username="admin", password="admin"):
     """
     🚀 Super NTP Update - Compatible with main.py
     """
     try:
-        # 1. Login to miner
-        session, err = login_to_miner(miner_name, username, password)
-        if not session:
-            return {"success": False, "message": f"❌ Login error: {err}"}
-        
-        # 2. Get base URL
+        # 1. Get base URL
         base, port, err2 = _get_miner_base(miner_name)
         if err2:
             return {"success": False, "message": f"❌ {err2}"}
         
-        system_url = f"{base}/cgi-bin/luci/admin/system/system"
+        # one action at a time per miner on the shared session
+        with luci_sessions.lock(base):
+            return _apply_ntp(base, miner_name, enable_ntp, custom_servers, timezone, username, password)
         
-        # 3. Get system page
+    except Exception as e:
+        return {"success": False, "message": f"❌ Unknown error: {str(e)}"}
+
+# timezone field names used by different firmwares; the ones a miner really
+# has are remembered after the first page load
+TZ_KEYS = [
+    "cbid.system.cfg02e48a.zonename",
+    "cbid.system.system.zonename",
+    "cbid.system.timezone"
+]
+
+def _apply_ntp(base, miner_name, enable_ntp, custom_servers, timezone, username, password):
+    system_path = "/cgi-bin/luci/admin/system/system"
+    servers = custom_servers or DEFAULT_NTP_SERVERS
+    
+    for attempt in range(2):
+        # 1. Security token (page is loaded only when the session has none cached)
         try:
-            response = session.get(system_url, timeout=10)
-            if response.status_code != 200:
-                return {"success": False, "message": f"❌ Page load error: {response.status_code}"}
+            # the page is also needed once to learn the miner's timezone fields
+            tz_keys = luci_sessions.layout(base, "ntp_tz_keys")
+            token, html, err = luci_sessions.token(base, username, password, system_path, input_value, reload=tz_keys is None)
+            if err:
+                return {"success": False, "message": f"❌ Login error: {err}"}
         except Exception as e:
             return {"success": False, "message": f"❌ Page load error: {e}"}
         
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # 4. Get security token
-        token_input = soup.find("input", {"name": "token"})
-        token = token_input["value"] if token_input and token_input.has_attr("value") else ""
-        
         if not token:
             return {"success": False, "message": "❌ Security token not found"}
         
-        # 5. Prepare data
-        servers = custom_servers or DEFAULT_NTP_SERVERS
+        if html is not None:
+            found = [key for key in TZ_KEYS if f'name="{key}"' in html]
+            tz_keys = found or TZ_KEYS
+            luci_sessions.remember_layout(base, "ntp_tz_keys", tz_keys)
+        
+        # 2. Prepare data
         form_data = {
             "token": token,
             "cbi.submit": "1",
@@ -114,11 +103,6 @@ def super_ntp_update(miner_name, enable_ntp=True, custom_servers=None, timezone=
         }
         
         # Set timezone
-        tz_keys = [
-            "cbid.system.cfg02e48a.zonename",
-            "cbid.system.system.zonename", 
-            "cbid.system.timezone"
-        ]
         for key in tz_keys:
             form_data[key] = timezone
         
@@ -134,42 +118,49 @@ def super_ntp_update(miner_name, enable_ntp=True, custom_servers=None, timezone=
             form_data["cbid.system.ntp.server"] = servers[0]
             form_data["cbid.system.ntp.server.1"] = servers[0]
         
-        # 6. Send request
+        # 3. Send request
         try:
-            post_response = session.post(system_url, data=form_data, timeout=15)
-            
-            if post_response.status_code in (200, 302):
-                return {
-                    "success": True, 
-                    "message": f"✅ NTP updated for miner {miner_name}",
-                    "ntp_enabled": enable_ntp,
-                    "servers": servers,
-                    "timezone": timezone,
-                    "miner": miner_name
-                }
-            else:
-                return {"success": False, "message": f"❌ Server error: {post_response.status_code}"}
-                
+            post_response, err = luci_sessions.request(base, username, password, "POST", system_path, data=form_data, timeout=15)
+            if err:
+                return {"success": False, "message": f"❌ Send error: {err}"}
         except Exception as e:
             return {"success": False, "message": f"❌ Send error: {e}"}
         
-    except Exception as e:
-        return {"success": False, "message": f"❌ Unknown error: {str(e)}"}
+        if post_response.status_code in (200, 302):
+            return {
+                "success": True, 
+                "message": f"✅ NTP updated for miner {miner_name}",
+                "ntp_enabled": enable_ntp,
+                "servers": servers,
+                "timezone": timezone,
+                "miner": miner_name
+            }
+        
+        # stale token or changed firmware - rediscover from the page once
+        luci_sessions.forget_token(base, username)
+        luci_sessions.forget_layout(base, "ntp_tz_keys")
+    
+    return {"success": False, "message": f"❌ Server error: {post_response.status_code}"}
 
-def bulk_super_ntp_update(miner_names, enable_ntp=True, custom_servers=None, timezone="Asia/Tehran", username="admin", password="admin"):
+def bulk_super_ntp_update(miner_names, enable_ntp=True, custom_servers=None, timezone="Asia/Tehran", username="admin", password="admin", max_workers=NTP_BULK_WORKERS):
     """
-    Bulk update miners - Compatible with main.py
+    Bulk update miners concurrently (at most max_workers at once, each on its
+    shared LuCI session). Returns one result row per miner, in input order.
     """
-    results = []
-    for miner in miner_names:
-        result = super_ntp_update(miner, enable_ntp, custom_servers, timezone, username, password)
-        results.append({
+    def _update(miner):
+        return super_ntp_update(miner, enable_ntp, custom_servers, timezone, username, password)
+
+    by_miner = {}
+    for miner, result, error in run_bulk(_update, miner_names, max_workers):
+        if error:
+            result = {"success": False, "message": f"❌ {error}"}
+        by_miner[miner] = {
             "miner": miner,
             "success": result.get("success", False),
             "message": result.get("message", "")
-        })
-    
-    return results
+        }
+
+    return [by_miner[m] for m in miner_names if m in by_miner]
 
 # ===========================
 # Existing functions for compatibility
@@ -243,6 +234,7 @@ def get_ntp_html():
             <div id="ntpProgressBar" style="height:100%; width:0%; background:linear-gradient(90deg,#10b981,#3b82f6); transition:width 0.3s;"></div>
         </div>
         <div id="currentStatus" style="margin-top:10px; font-size:14px; color:#93c5fd; text-align:center; min-height:20px; font-weight:600;">Ready to start...</div>
+        <div id="ntpResults" style="display:none; margin-top:12px; max-height:220px; overflow-y:auto; background:rgba(0,0,0,0.2); border-radius:8px;"></div>
     </div>
 
     <!-- Buttons -->
@@ -301,88 +293,59 @@ function runSuperUpdate() {
     const progressBar = document.getElementById('ntpProgressBar');
     const progressText = document.getElementById('ntpProgressText');
     const statusText = document.getElementById('currentStatus');
-    
-    let completed = 0;
-    const total = miners.length;
+    const resultsBox = document.getElementById('ntpResults');
     
     // Reset progress
-    progressBar.style.width = '0%';
-    progressText.textContent = '0%';
-    statusText.textContent = '🔄 Starting update...';
+    progressBar.style.width = '10%';
+    progressText.textContent = '...';
+    statusText.textContent = `🔄 Updating ${miners.length} miners in parallel...`;
     statusText.style.color = '#fbbf24';
+    resultsBox.style.display = 'none';
+    resultsBox.innerHTML = '';
     
     isUpdating = true;
     
-    console.log(`🚀 Starting super update for ${total} miners...`);
-    
-    // Show immediate feedback
-    setTimeout(() => {
-        statusText.textContent = '⏳ Connecting to miners...';
-    }, 100);
-    
-    miners.forEach((miner, index) => {
-        setTimeout(() => {
-            statusText.textContent = `🔄 Updating miner ${miner}...`;
-            statusText.style.color = '#fbbf24';
-            
-            fetch('/update_ntp', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({
-                    miner: miner,
-                    ntp_enabled: enableNTP,
-                    ntp_servers: ntpServer ? [ntpServer] : [], // Single server
-                    timezone: timezone
-                })
-            })
-            .then(r => r.json())
-            .then(data => {
-                completed++;
-                const progress = Math.round((completed / total) * 100);
-                progressBar.style.width = progress + '%';
-                progressText.textContent = progress + '%';
-                
-                console.log(`✅ Miner ${miner}:`, data);
-                
-                if (data.success) {
-                    statusText.textContent = `✅ ${miner}: ${data.message}`;
-                    statusText.style.color = '#86efac';
-                } else {
-                    statusText.textContent = `❌ ${miner}: ${data.message}`;
-                    statusText.style.color = '#fca5a5';
-                }
-                
-                if (completed === total) {
-                    isUpdating = false;
-                    setTimeout(() => {
-                        statusText.textContent = '🎉 All miners updated successfully!';
-                        statusText.style.color = '#86efac';
-                        setTimeout(() => {
-                            alert('✅ Super NTP Update completed successfully!');
-                            closeNtpModal();
-                        }, 1000);
-                    }, 500);
-                }
-            })
-            .catch(err => {
-                completed++;
-                const progress = Math.round((completed / total) * 100);
-                progressBar.style.width = progress + '%';
-                progressText.textContent = progress + '%';
-                
-                console.error(`❌ Miner ${miner}:`, err);
-                statusText.textContent = `❌ Error on ${miner}`;
-                statusText.style.color = '#fca5a5';
-                
-                if (completed === total) {
-                    isUpdating = false;
-                    setTimeout(() => {
-                        alert('⚠️ Some miners may not be updated');
-                        closeNtpModal();
-                    }, 500);
-                }
-            });
-        }, index * 800); // 800ms delay between requests
+    // one request - the server updates all miners concurrently
+    fetch('/update_ntp_bulk', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+            miners: miners,
+            ntp_enabled: enableNTP,
+            ntp_servers: ntpServer ? [ntpServer] : [], // Single server
+            timezone: timezone
+        })
+    })
+    .then(r => r.json())
+    .then(data => {
+        isUpdating = false;
+        if (data.error) throw new Error(data.error);
+        
+        progressBar.style.width = '100%';
+        progressText.textContent = '100%';
+        
+        const rows = data.results.map(r =>
+            `<tr><td style="padding:6px 10px; font-weight:700;">${r.miner}</td>` +
+            `<td style="padding:6px 10px; color:${r.success ? '#86efac' : '#fca5a5'};">${r.success ? '✅' : '❌'} ${r.message}</td></tr>`
+        ).join('');
+        resultsBox.innerHTML = `<table style="width:100%; border-collapse:collapse; font-size:13px;">${rows}</table>`;
+        resultsBox.style.display = 'block';
+        
+        if (data.success_count === data.total) {
+            statusText.textContent = `🎉 All ${data.total} miners updated in ${data.elapsed}s`;
+            statusText.style.color = '#86efac';
+        } else {
+            statusText.textContent = `⚠️ ${data.success_count}/${data.total} miners updated in ${data.elapsed}s`;
+            statusText.style.color = '#fca5a5';
+        }
+    })
+    .catch(err => {
+        isUpdating = false;
+        console.error('❌ NTP bulk update:', err);
+        progressBar.style.width = '0%';
+        progressText.textContent = '0%';
+        statusText.textContent = `❌ ${err && err.message ? err.message : 'Network error'}`;
+        statusText.style.color = '#fca5a5';
     });
 }
 </script>
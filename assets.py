@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+assets.py - Moves the static inline <style>/<script> blocks of the dashboard
+template out into content-hashed files that browsers can cache forever.
+"""
+
+import gzip
+import hashlib
+import re
+
+ASSET_PREFIX = "/assets"
+# a hashed name never changes content, so it may be cached for a year
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+_INLINE_BLOCK = re.compile(r"<(style|script)>(.*?)</\1>", re.S)
+
+_MIMETYPES = {
+    "css": "text/css; charset=utf-8",
+    "js": "application/javascript; charset=utf-8",
+}
+
+
+class AssetRegistry:
+    def __init__(self, prefix=ASSET_PREFIX):
+        self.prefix = prefix
+        self._files = {}  # filename -> (body bytes, gzip bytes, mimetype)
+
+    def add(self, name, ext, text):
+        body = text.encode("utf-8")
+        digest = hashlib.sha1(body).hexdigest()[:12]
+        filename = f"{name}.{digest}.{ext}"
+        if filename not in self._files:
+            self._files[filename] = (body, gzip.compress(body, 9), _MIMETYPES[ext])
+        return f"{self.prefix}/{filename}"
+
+    def externalize(self, html, name="dashboard"):
+        """
+        Replace every inline <style>/<script> block without Jinja syntax by a
+        <link>/<script src>. Order is kept, so scripts still run in sequence.
+        """
+        counter = [0]
+
+        def _replace(m):
+            tag, body = m.group(1), m.group(2)
+            if "{{" in body or "{%" in body:
+                return m.group(0)
+            counter[0] += 1
+            part = f"{name}-{counter[0]}"
+            if tag == "style":
+                return f'<link rel="stylesheet" href="{self.add(part, "css", body)}">'
+            return f'<script src="{self.add(part, "js", body)}"></script>'
+
+        return _INLINE_BLOCK.sub(_replace, html)
+
+    def get(self, filename):
+        """(body, gzip_body, mimetype) or None"""
+        return self._files.get(filename)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bench.py - Micro-benchmarks for the hot parsing paths.
+
+    python bench.py tokens [captured_page.html ...]
+    python bench.py colorize [syslog.txt]
+    python bench.py syslog [syslog.txt]
+    python bench.py extract [syslog_page.html ...]
+    python bench.py anomalies [syslog.txt]
+
+Without files a synthetic LuCI page (~60 KB, a few hundred inputs, several
+scripts) is used. Save real pages from a miner with the browser
+("Save page as -> HTML only") to measure on actual firmware markup.
+"""
+
+import html
+import random
+import re
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from bs4 import BeautifulSoup
+
+from luci_session import input_value, script_token
+from logs_viewer import logs_viewer, MINING_KEYWORDS
+from log_anomalies import ANOMALY_RULES, classify
+
+
+def _synthetic_luci_page(kind):
+    rows = "".join(
+        f'<div class="cbi-value"><label class="cbi-value-title">Option {i}</label>'
+        f'<div class="cbi-value-field"><input type="text" class="cbi-input-text" '
+        f'name="cbid.system.cfg{i:04x}.option" id="cbid.system.cfg{i:04x}.option" value="v{i}" />'
+        f'</div></div>\n'
+        for i in range(300)
+    )
+    scripts = "".join(f"<script type=\"text/javascript\">var cfg{i} = {{ a: {i} }};</script>\n" for i in range(8))
+    head = '<html><head><link rel="stylesheet" href="/luci-static/bootstrap/cascade.css"></head><body>'
+    if kind == "script":
+        token = "<script type=\"text/javascript\">XHR.get('/cgi-bin/luci/admin/system/reboot/call', { token: '0123456789abcdef0123456789abcdef' }, function() {});</script>"
+        return head + scripts + rows + token + "</body></html>"
+    form = '<form method="post" action="/cgi-bin/luci/admin/system/system">' \
+           '<input type="hidden" name="token" value="0123456789abcdef0123456789abcdef" />'
+    return head + scripts + form + rows + "</form></body></html>"
+
+
+# --- previous BeautifulSoup implementations (reference) ---
+
+def bs4_input_token(html):
+    token_input = BeautifulSoup(html, "html.parser").find("input", {"name": "token"})
+    return token_input.get("value") if token_input else None
+
+
+def bs4_script_token(html):
+    soup = BeautifulSoup(html, "html.parser")
+    for s in soup.find_all("script"):
+        if s.string and "token" in s.string:
+            start = s.string.find("token: '")
+            if start == -1:
+                return None
+            start += len("token: '")
+            end = s.string.find("'", start)
+            return s.string[start:end] or None
+    return None
+
+
+def _run(label, func, html, number):
+    per_call = timeit.timeit(lambda: func(html), number=number) / number
+    print(f"  {label:<22} {per_call * 1000:9.3f} ms")
+    return per_call
+
+
+def bench_tokens(paths):
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        pages.append((path, "script" if "token:" in html and 'name="token"' not in html else "input", html))
+    if not pages:
+        pages = [("synthetic form page", "input", _synthetic_luci_page("input")),
+                 ("synthetic reboot page", "script", _synthetic_luci_page("script"))]
+
+    for name, kind, html in pages:
+        if kind == "script":
+            fast, slow = script_token, bs4_script_token
+        else:
+            fast, slow = input_value, bs4_input_token
+        assert fast(html) == slow(html), f"{name}: extractors disagree"
+        print(f"{name} ({len(html) // 1024} KB, token={fast(html)!r})")
+        t_slow = _run("BeautifulSoup", slow, html, 20)
+        t_fast = _run("regex extractor", fast, html, 500)
+        print(f"  speedup                {t_slow / t_fast:9.1f}x")
+
+
+def _synthetic_syslog(n):
+    kinds = [
+        "btminer[1342]: chain 0 temp 75.2 fan 4500 rpm ct:12 cv:830",
+        "kernel: [ 1234.567] eth0: link up 1000Mbps full duplex",
+        "btminer[1342]: ERROR: chain 1 failed to read temp sensor",
+        "btminer[1342]: pool stratum+tcp://btc.pool.example:3333 connected ok",
+        "btminer[1342]: fan fault detected speed 0",
+        "btminer[1342]: power vout 12.5 watts 3350 running",
+        "daemon.warn: W temperature protect triggered at 95.0",
+        "btminer[1]: E chain 2 crc error count 17",
+    ]
+    start = datetime.now() - timedelta(seconds=5 * n)
+    rng = random.Random(1)
+    return [
+        (start + timedelta(seconds=5 * i)).strftime("%a %b %d %H:%M:%S %Y") + " daemon.info " + rng.choice(kinds)
+        for i in range(n)
+    ]
+
+
+def legacy_colorize_log_line(line, scheme=logs_viewer.color_scheme):
+    """previous implementation: ~40 chained re.sub passes per line (reference)"""
+    safe = (line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;"))
+    leading_star = ''
+    if safe.startswith('*'):
+        leading_star = '<span style="color:%s;font-weight:bold;">*</span> ' % scheme['ERROR']
+        safe = safe[1:]
+    colored = re.sub(r'(\d+\.\d+|\d+)', lambda m: f"<span style='color:{scheme['NUMBERS']};font-weight:bold;'>{m.group(1)}</span>", f"[{safe}]")
+    colored = re.sub(r'\b(ct:|cv:|ct|cv)\b', lambda m: f"<span style='color:{scheme['CT_CV']};font-weight:bold;'>{m.group(1)}</span>", colored, flags=re.IGNORECASE)
+    for kw in MINING_KEYWORDS:
+        colored = re.sub(r'\b' + re.escape(kw) + r'\b', lambda m: f"<span style='color:{scheme['KEYWORDS']};font-weight:bold;'>{m.group(0)}</span>", colored, flags=re.IGNORECASE)
+    for pat, col in [
+        (r'(error|failed|failure|crash|panic|fault|unable|cannot|timeout)', scheme['ERROR']),
+        (r'(warn|warning|alert|notice|attention|caution)', scheme['WARNING']),
+        (r'(success|completed|ready|online|started|connected|ok|running|active)', scheme['SUCCESS']),
+    ]:
+        colored = re.sub(pat, lambda m: f"<span style='color:{col};font-weight:bold;'>{m.group(0)}</span>", colored, flags=re.IGNORECASE)
+    for pat in [r'(\w{3} \d{1,2} \d{2}:\d{2}:\d{2})', r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})',
+                r'(\d{2}-\d{2} \d{2}:\d{2}:\d{2})', r'(\d{2}:\d{2}:\d{2})']:
+        colored = re.sub(pat, lambda m: f"<span style='color:{scheme['TIMESTAMP']};'>{m.group(1)}</span>", colored)
+    colored = colored.replace('[', f"<span style='color:{scheme['BRACKETS']};font-weight:bold;'>[</span>")
+    colored = colored.replace(']', f"<span style='color:{scheme['BRACKETS']};font-weight:bold;'>]</span>")
+    return leading_star + colored
+
+
+def bench_colorize(paths):
+    if paths:
+        with open(paths[0], encoding="utf-8", errors="replace") as f:
+            lines = [ln.strip() for ln in f if ln.strip()]
+        name = paths[0]
+    else:
+        lines = _synthetic_syslog(10000)
+        name = "synthetic syslog"
+    print(f"{name} ({len(lines)} lines)")
+    t_old = timeit.timeit(lambda: [legacy_colorize_log_line(ln) for ln in lines], number=1)
+    t_new = min(timeit.repeat(lambda: [logs_viewer.colorize_log_line(ln) for ln in lines], number=1, repeat=3))
+    out_old = sum(len(legacy_colorize_log_line(ln)) for ln in lines)
+    out_new = sum(len(logs_viewer.colorize_log_line(ln)) for ln in lines)
+    print(f"  chained re.sub         {t_old * 1000:9.1f} ms   {out_old // 1024} KB html")
+    print(f"  single pass            {t_new * 1000:9.1f} ms   {out_new // 1024} KB html")
+    print(f"  speedup                {t_old / t_new:9.1f}x")
+    # the number pass used to split timestamps before the timestamp pass ran
+    ts_span = f"<span style='color:{logs_viewer.color_scheme['TIMESTAMP']};'>"
+    sample = lines[:1000]
+    old_ts = sum(1 for ln in sample if ts_span in legacy_colorize_log_line(ln))
+    new_ts = sum(1 for ln in sample if ts_span in logs_viewer.colorize_log_line(ln))
+    print(f"  lines with a coloured timestamp: old {old_ts}/{len(sample)}, new {new_ts}/{len(sample)}")
+
+
+def legacy_select_recent(lines, hours):
+    """previous parse_real_syslog filter: regex + strptime per line, last 200 (reference)"""
+    now = datetime.now()
+    cutoff = now - timedelta(hours=hours)
+    recent = []
+    for ln in lines:
+        m = re.search(r'(\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)', ln)
+        if m:
+            try:
+                t = datetime.strptime(f"{now.year}-{m.group(1)}", "%Y-%m-%d %H:%M:%S.%f")
+            except Exception:
+                try:
+                    t = datetime.strptime(f"{now.year}-{m.group(1)}", "%Y-%m-%d %H:%M:%S")
+                except Exception:
+                    t = None
+            if t and t >= cutoff:
+                recent.append(ln)
+    chosen = recent[-200:] if len(recent) >= 10 else lines[-200:]
+    for i, ln in enumerate(chosen):
+        if re.search(r'\bE\b', ln):
+            chosen[i] = f"*{ln}"
+    return chosen
+
+
+def bench_syslog(paths):
+    if paths:
+        with open(paths[0], encoding="utf-8", errors="replace") as f:
+            samples = [(paths[0], [ln.strip() for ln in f if ln.strip()])]
+    else:
+        logread = _synthetic_syslog(100000)
+        # btminer style "MM-DD HH:MM:SS.mmm" stamps - the only format the old filter understood
+        btminer = [datetime.strptime(ln[:24], "%a %b %d %H:%M:%S %Y").strftime("%m-%d %H:%M:%S.123") + ln[24:]
+                   for ln in logread]
+        samples = [("synthetic logread (100k lines)", logread), ("synthetic btminer stamps (100k lines)", btminer)]
+
+    for name, lines in samples:
+        print(name)
+        for hours in (2, 24):
+            t_old = timeit.timeit(lambda: legacy_select_recent(lines, hours), number=1)
+            t_new = min(timeit.repeat(lambda: logs_viewer.select_recent(lines, hours), number=1, repeat=3))
+            old_n = len(legacy_select_recent(lines, hours))
+            new_n = len(logs_viewer.select_recent(lines, hours))
+            print(f"  {hours:>2} h  regex+strptime {t_old * 1000:8.1f} ms ({old_n} lines)   "
+                  f"compiled+bisect {t_new * 1000:8.2f} ms ({new_n} lines)   {t_old / t_new:7.1f}x")
+
+
+def bench_extract(paths):
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append((path, f.read()))
+    if not pages:
+        body = html.escape("\n".join(ln + " <chain> & <pool>" for ln in _synthetic_syslog(20000)))
+        pad = "<div class=\"cbi-section\">" + "x" * 20000 + "</div>"
+        pages = [("synthetic syslog page", f"<html><body>{pad}<textarea readonly=\"readonly\" wrap=\"off\" "
+                                          f"rows=\"40\" id=\"syslog\">{body}</textarea>{pad}</body></html>")]
+
+    for name, page in pages:
+        lines = logs_viewer.extract_syslog_lines(page)
+        assert lines == logs_viewer.extract_syslog_lines_dom(page), f"{name}: extractors disagree"
+        print(f"{name} ({len(page) // 1024} KB, {len(lines)} lines)")
+        t_dom = _run("BeautifulSoup DOM", logs_viewer.extract_syslog_lines_dom, page, 3)
+        t_scan = _run("textarea/pre scan", logs_viewer.extract_syslog_lines, page, 10)
+        print(f"  speedup                {t_dom / t_scan:9.1f}x")
+
+
+def bench_anomalies(paths):
+    if paths:
+        with open(paths[0], encoding="utf-8", errors="replace") as f:
+            lines = [ln.strip() for ln in f if ln.strip()]
+        name = paths[0]
+    else:
+        lines = _synthetic_syslog(100000)
+        name = "synthetic syslog"
+    print(f"{name} ({len(lines)} lines)")
+    # one search per rule over every line (reference)
+    separate = [(rule, re.compile(r"\b(?:%s)" % pattern, re.I)) for rule, _, _, pattern in ANOMALY_RULES]
+
+    def per_rule():
+        return [{rule for rule, rx in separate if rx.search(ln)} for ln in lines]
+
+    t_old = min(timeit.repeat(per_rule, number=1, repeat=3))
+    t_new = min(timeit.repeat(lambda: [classify(ln) for ln in lines], number=1, repeat=3))
+    assert per_rule() == [classify(ln) for ln in lines], "rule sets disagree"
+    print(f"  regex per rule         {t_old * 1000:9.1f} ms")
+    print(f"  single compiled pass   {t_new * 1000:9.1f} ms")
+    print(f"  speedup                {t_old / t_new:9.1f}x")
+
+
+BENCHMARKS = {
+    "tokens": bench_tokens,
+    "colorize": bench_colorize,
+    "syslog": bench_syslog,
+    "extract": bench_extract,
+    "anomalies": bench_anomalies,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"usage: python bench.py {{{'|'.join(BENCHMARKS)}}} [files ...]")
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](sys.argv[2:])
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bulk.py - Run one LuCI action on many miners with a bounded worker pool and
+yield each result as soon as it is done (for streamed progress responses).
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+BULK_MAX_WORKERS = 16
+# سقف زمان هر ماینر (ثانیه) از لحظه‌ی شروع کارش
+BULK_MINER_TIMEOUT = 60
+
+
+def run_bulk(func, miners, max_workers=BULK_MAX_WORKERS, timeout=BULK_MINER_TIMEOUT):
+    """
+    Call func(miner) for every miner concurrently (at most max_workers at once).
+    Yields (miner, result, error) in completion order; a miner that runs longer
+    than `timeout` is reported with error "Timeout" (its thread is abandoned).
+    """
+    miners = list(miners)
+    if not miners:
+        return
+    started = {}
+
+    def _run(miner):
+        started[miner] = time.monotonic()
+        return func(miner)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(miners))))
+    try:
+        pending = {executor.submit(_run, m): m for m in miners}
+        while pending:
+            done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for fut in done:
+                miner = pending.pop(fut)
+                try:
+                    yield miner, fut.result(), None
+                except Exception as e:
+                    yield miner, None, str(e)
+            now = time.monotonic()
+            for fut, miner in list(pending.items()):
+                if miner in started and now - started[miner] > timeout:
+                    pending.pop(fut)
+                    fut.cancel()
+                    yield miner, None, "Timeout"
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+log_anomalies.py - Hardware/pool anomaly counters from syslog lines.
+
+A compiled rule set classifies a line in a single scan. The log archive
+hands over every newly archived line, and the counts are written to the
+metrics store as log_<anomaly> series (per miner, per minute of the log
+timestamp), so the dashboard can show them next to the hashrate.
+"""
+
+import re
+import time
+from collections import Counter
+
+# name -> (label for the dashboard, trigger words, pattern)
+# every alternative of a pattern starts at one of its rule's trigger words
+ANOMALY_RULES = [
+    ("chain_error", "Chain errors", ("chain", "error", "failed"),
+     r"chain\s*\[?\d+\]?:?\s+(?:\S+\s+){0,3}?(?:err(?:or)?s?|fail(?:ed|ure)?|crc|lost|missing|invalid|abnormal)\b"
+     r"|(?:error|failed)\b[^\n]{0,30}?\bchain\s*\[?\d+"),
+    ("fan_fault", "Fan faults", ("fan",),
+     r"fan\w*\s*\[?\d*\]?:?\s+(?:\S+\s+){0,2}?(?:fault|fail(?:ed|ure)?|err(?:or)?|lost|stop(?:ped)?|speed\s+0\b|too\s+(?:low|slow))"),
+    ("temp_protect", "Temperature protections", ("temp", "over", "protect"),
+     r"(?:temp\w*|over[-\s]?heat\w*)\s+(?:\S+\s+){0,2}?protect\w*"
+     r"|protect\w*\s+(?:\S+\s+){0,2}?temp\w*"
+     r"|over[-\s]?(?:temp\w*|heat\w*)"),
+    ("pool_disconnect", "Pool disconnects", ("pool", "stratum", "disconnect", "lost", "connection"),
+     r"(?:pool|stratum)\S*\s+(?:\S+\s+){0,3}?(?:disconnect\w*|lost|dead|down|fail(?:ed|ure)?|time[sd]?\s?out|refused|unreachable)"
+     r"|(?:disconnect(?:ed)?\s+from|lost\s+connection\s+to|connection\s+lost\s+to)\s+(?:\S+\s+)?(?:pool|stratum)"),
+    ("restart", "Restarts", ("restart", "reboot", "booting", "watchdog", "btminer", "cgminer", "bmminer", "start"),
+     r"(?:restart(?:ed|ing)?|reboot(?:ed|ing)?|booting\s+linux|watchdog\s+(?:reset|timeout)"
+     r"|(?:bt|cg|bm)miner\s+(?:re)?start(?:ed|ing)?|start(?:ed|ing)\s+(?:bt|cg|bm)miner)\b"),
+]
+ANOMALIES = [name for name, _, _, _ in ANOMALY_RULES]
+ANOMALY_LABELS = {name: label for name, label, _, _ in ANOMALY_RULES}
+# metrics store series of each anomaly
+ANOMALY_METRICS = {name: f"log_{name}" for name in ANOMALIES}
+
+# One scan per line finds the trigger words (a plain literal alternation, so
+# the regex engine can skip ahead); only the rules of a trigger are tried there.
+_RULES_BY_TRIGGER = {}
+for _name, _, _triggers, _pattern in ANOMALY_RULES:
+    _rule = re.compile(r"\b(?:%s)" % _pattern)
+    for _trigger in _triggers:
+        _RULES_BY_TRIGGER.setdefault(_trigger, []).append((_name, _rule))
+_TRIGGER = re.compile("|".join(sorted(_RULES_BY_TRIGGER, key=len, reverse=True)))
+
+
+def classify(line):
+    """Anomalies found in one line (each counted once per line)"""
+    lower = line.lower()
+    found = set()
+    for m in _TRIGGER.finditer(lower):
+        for name, rule in _RULES_BY_TRIGGER[m.group()]:
+            if name not in found and rule.match(lower, m.start()):
+                found.add(name)
+    return found
+
+
+def count_anomalies(entries, bucket=60):
+    """[(ts, line), ...] -> Counter {(anomaly, bucket start ts): count}"""
+    counts = Counter()
+    for ts, line in entries:
+        for name in classify(line):
+            counts[(name, int(ts) - int(ts) % bucket)] += 1
+    return counts
+
+
+class AnomalyCounter:
+    """Log archive hook that turns new lines into metrics store counters"""
+
+    def __init__(self, metrics_store):
+        self.metrics_store = metrics_store
+
+    def on_archived(self, miner, entries):
+        counts = count_anomalies(entries)
+        if counts:
+            self.metrics_store.record(
+                (miner, ANOMALY_METRICS[name], ts, float(n)) for (name, ts), n in counts.items()
+            )
+
+    def totals(self, miners, hours=24, now=None):
+        """{miner: {anomaly: count}} over the last `hours` (miners without any are left out)"""
+        now = now or time.time()
+        metrics = {metric: name for name, metric in ANOMALY_METRICS.items()}
+        out = {}
+        for (miner, metric), total in self.metrics_store.totals(miners, list(metrics), now - hours * 3600, now).items():
+            if total:
+                out.setdefault(miner, {})[metrics[metric]] = int(total)
+        return out
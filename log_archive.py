@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+log_archive.py - Persistent syslog archive for all miners.
+
+Every new syslog line is stored once (deduplicated by a hash of the line and
+its occurrence within the fetch), zlib-compressed, next to its miner,
+timestamp and severity. A contentless SQLite FTS5 index
+over the text answers farm-wide searches without scanning the archive.
+"""
+
+import hashlib
+import os
+import re
+import time
+import zlib
+from collections import Counter
+
+from bulk import run_bulk
+from logs_viewer import parse_syslog_line
+from shared import PeriodicWorker, SQLiteStore
+
+LOG_ARCHIVE_DB = os.environ.get("LOG_ARCHIVE_DB", "logs.db")
+LOG_ARCHIVE_RETENTION = int(os.environ.get("LOG_ARCHIVE_RETENTION_DAYS", 30)) * 86400
+# هر چند ثانیه لاگ همه‌ی ماینرها جمع‌آوری می‌شود
+LOG_COLLECT_INTERVAL = float(os.environ.get("LOG_COLLECT_INTERVAL", 300))
+LOG_COLLECT_WORKERS = 4
+
+PRUNE_EVERY = 3600
+MAX_SEARCH_RESULTS = 1000
+
+SEVERITIES = ("err", "warn", "info", "debug")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_lines (
+    id INTEGER PRIMARY KEY,
+    miner TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    severity TEXT NOT NULL,
+    hash BLOB NOT NULL UNIQUE,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS log_lines_miner_ts ON log_lines (miner, ts);
+CREATE INDEX IF NOT EXISTS log_lines_ts ON log_lines (ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5 (line, content='');
+"""
+
+_LEVELS = {
+    "emerg": "err", "alert": "err", "crit": "err", "err": "err", "error": "err",
+    "warn": "warn", "warning": "warn", "notice": "info", "info": "info", "debug": "debug",
+}
+_ERROR_WORDS = re.compile(r"\b(error|failed|failure|fault|crash|panic)\b", re.I)
+_WARN_WORDS = re.compile(r"\b(warn|warning|protect|alert)\b", re.I)
+_FTS_TERM = re.compile(r'[^\s"]+\*?')
+
+
+def parse_line(line, now=None):
+    """raw syslog line -> (unix ts, severity); the header is read by logs_viewer.parse_syslog_line"""
+    now = now or time.time()
+    ts, level, _ = parse_syslog_line(line, now)
+    level = _LEVELS.get(level or "")
+    # firmwares log most things as info - the text tells what it really is
+    if level in (None, "info", "debug"):
+        if _ERROR_WORDS.search(line):
+            level = "err"
+        elif _WARN_WORDS.search(line):
+            level = "warn"
+    return int(ts if ts is not None else now), level or "info"
+
+
+def fts_query(text):
+    """User search text -> FTS5 query: every word must match, `word*` is a prefix"""
+    terms = []
+    for term in _FTS_TERM.findall(text or ""):
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class LogArchive(SQLiteStore):
+    def __init__(self, path=LOG_ARCHIVE_DB, retention=LOG_ARCHIVE_RETENTION):
+        super().__init__(path)
+        self.retention = retention
+        self._listeners = []
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def subscribe(self, callback):
+        """callback(miner, [(ts, line), ...]) runs with the lines an append() actually stored"""
+        self._listeners.append(callback)
+
+    def append(self, miner, lines, now=None):
+        """Store new lines of one miner; lines already archived are skipped. Returns the count added."""
+        now = now or time.time()
+        added = []
+        # identical lines of one fetch (a burst within one second) are told
+        # apart by their occurrence, so each of them is stored and counted
+        seen = Counter()
+        conn = self._conn()
+        with self._write_lock, conn:
+            for line in lines:
+                line = line.lstrip("*").strip()
+                if not line:
+                    continue
+                ts, severity = parse_line(line, now)
+                key = f"{miner}\0{line}"
+                if seen[line]:
+                    # first occurrence keeps the plain key of archives written before
+                    key += f"\0{seen[line]}"
+                seen[line] += 1
+                digest = hashlib.sha1(key.encode("utf-8")).digest()[:16]
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO log_lines (miner, ts, severity, hash, body) VALUES (?, ?, ?, ?, ?)",
+                    (miner, ts, severity, digest, zlib.compress(line.encode("utf-8"))),
+                )
+                if cur.rowcount:
+                    conn.execute("INSERT INTO log_fts (rowid, line) VALUES (?, ?)", (cur.lastrowid, line))
+                    added.append((ts, line))
+        if added:
+            for callback in list(self._listeners):
+                try:
+                    callback(miner, added)
+                except Exception as e:
+                    print(f"💥 Log archive listener failed: {e}")
+        if now - self._last_prune > PRUNE_EVERY:
+            self.prune(now)
+        return len(added)
+
+    def on_new_lines(self, miner, lines):
+        """logs_viewer hook"""
+        self.append(miner, lines)
+
+    def prune(self, now=None):
+        """Drop lines older than the retention (index entries included)"""
+        now = now or time.time()
+        conn = self._conn()
+        cutoff = int(now - self.retention)
+        with self._write_lock, conn:
+            old = conn.execute("SELECT id, body FROM log_lines WHERE ts < ?", (cutoff,)).fetchall()
+            # contentless FTS: a delete has to repeat the indexed text
+            conn.executemany(
+                "INSERT INTO log_fts (log_fts, rowid, line) VALUES ('delete', ?, ?)",
+                [(row_id, zlib.decompress(body).decode("utf-8")) for row_id, body in old],
+            )
+            conn.execute("DELETE FROM log_lines WHERE ts < ?", (cutoff,))
+        self._last_prune = now
+
+    def search(self, text="", miner=None, severity=None, start=None, end=None, limit=200):
+        """
+        Newest matching lines first: [{"miner", "ts", "severity", "line"}, ...]
+        Without search text only the miner/severity/time filters apply.
+        """
+        where, params = [], []
+        query = fts_query(text)
+        # with search text the FTS index drives the scan - `+col` keeps the
+        # planner from switching to the miner/ts indexes and sorting
+        col = "+l." if query else "l."
+        if query:
+            sql = "SELECT l.miner, l.ts, l.severity, l.body FROM log_fts JOIN log_lines l ON l.id = log_fts.rowid"
+            where.append("log_fts MATCH ?")
+            params.append(query)
+        else:
+            sql = "SELECT l.miner, l.ts, l.severity, l.body FROM log_lines l"
+        if miner:
+            where.append(col + "miner = ?")
+            params.append(miner)
+        if severity:
+            where.append(col + "severity = ?")
+            params.append(severity)
+        if start is not None:
+            where.append(col + "ts >= ?")
+            params.append(int(start))
+        if end is not None:
+            where.append(col + "ts <= ?")
+            params.append(int(end))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if query:
+            # rowids follow arrival order: FTS5 walks them backwards and stops at LIMIT
+            # instead of sorting every match by ts
+            sql += " ORDER BY log_fts.rowid DESC LIMIT ?"
+        else:
+            sql += " ORDER BY l.ts DESC, l.id DESC LIMIT ?"
+        params.append(min(max(int(limit), 1), MAX_SEARCH_RESULTS))
+        rows = self._conn().execute(sql, params).fetchall()
+        rows.sort(key=lambda r: r[1], reverse=True)
+        return [
+            {"miner": m, "ts": ts, "severity": sev, "line": zlib.decompress(body).decode("utf-8")}
+            for m, ts, sev, body in rows
+        ]
+
+
+class LogCollector(PeriodicWorker):
+    """Background thread that pulls new syslog lines of every miner on an interval"""
+
+    thread_name = "log-collector"
+
+    def __init__(self, refresh, miners, interval=LOG_COLLECT_INTERVAL, max_workers=LOG_COLLECT_WORKERS):
+        """refresh -> callable(miner_name) returning an error message or None"""
+        super().__init__(interval)
+        self.refresh = refresh
+        self.miners = list(miners)
+        self.max_workers = max_workers
+        self.last_run = None
+        self.errors = {}
+
+    def collect_once(self):
+        for miner, error, exc in run_bulk(self.refresh, self.miners, self.max_workers):
+            error = exc or error
+            if error:
+                self.errors[miner] = error
+            else:
+                self.errors.pop(miner, None)
+        self.last_run = time.time()
+
+    run_once = collect_once
@@ -1,18 +1,405 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import codecs
+import heapq
+import html
+import queue
 import requests
 import re
+import threading
 import time
 import urllib3
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import datetime
 from bs4 import BeautifulSoup
 
+from bulk import run_bulk, BULK_MAX_WORKERS
+from luci_session import luci_sessions
+
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+SYSLOG_PATH = "/cgi-bin/luci/admin/status/syslog"
+# rpcd JSON-RPC: `log read` returns only the last N entries (no HTML page)
+UBUS_PATH = "/ubus"
+# ubus status codes that mean the miner will never serve `log read`
+# (3 method not found, 4 object not found, 6 permission denied, 8 not supported)
+UBUS_MISSING = frozenset((3, 4, 6, 8))
+# any other ubus failure skips it for this long, then it is tried again
+UBUS_RETRY_AFTER = 300
+
+# باز کردن دوباره‌ی مودال در این بازه مستقیم از حافظه جواب داده می‌شود
+LOG_CACHE_TTL = 10
+LOG_CACHE_LINES = 5000   # raw lines kept per miner
+LOG_TAIL_LINES = 300     # lines asked for when only new entries are needed
+# how many trailing cached lines must be found again to place the new ones
+LOG_OVERLAP_LINES = 3
+
+_SYSLOG_FACILITIES = ["kern", "user", "mail", "daemon", "auth", "syslog", "lpr", "news",
+                      "uucp", "cron", "authpriv", "ftp", "ntp", "security", "console", "cron",
+                      "local0", "local1", "local2", "local3", "local4", "local5", "local6", "local7"]
+_SYSLOG_LEVELS = ["emerg", "alert", "crit", "err", "warn", "notice", "info", "debug"]
+
+MINING_KEYWORDS = [
+    'btminer', 'bt', 'env', 'fan', 'ac', 'pin', 'vout', 'chain', 'temp', 'temperature',
+    'frequency', 'voltage', 'power', 'hashrate', 'kernel', 'miner', 'pool', 'asic', 'bitmain', 'antminer',
+    'speed', 'rpm', 'watts', 'volts', 'mhz', 'ghz', 'th/s', 'gh/s', 'mh/s'
+]
+
+STATUS_WORDS = [
+    # matched at the start of a word, so "errors" / "warnings" count too
+    ('ERROR', ('error', 'failed', 'failure', 'crash', 'panic', 'fault', 'unable', 'cannot', 'timeout')),
+    ('WARNING', ('warn', 'alert', 'notice', 'attention', 'caution')),
+    ('SUCCESS', ('success', 'completed', 'ready', 'online', 'started', 'connected', 'running', 'active')),
+]
+_KEYWORD_SET = frozenset(MINING_KEYWORDS)
+
+# One tokenizer for the whole colorizer: timestamps are taken before their
+# digits can become numbers; words are classified by lookup, not by regex.
+_LOG_TOKEN = re.compile(
+    r"(?P<TIMESTAMP>(?:[A-Za-z]{3} )?\b[A-Za-z]{3} +\d{1,2} \d{2}:\d{2}:\d{2}(?: \d{4})?"
+    r"|\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}"
+    r"|\d{2}-\d{2} \d{2}:\d{2}:\d{2}"
+    r"|\d{2}:\d{2}:\d{2})"
+    r"|(?P<WORD>[A-Za-z]\w*(?:/s\b)?)"
+    r"|(?P<NUMBERS>\d+\.\d+|\d+)"
+    r"|(?P<BRACKETS>[\[\]])"
+)
+_WORD_CLASS_CACHE = {}
+
+_MONTHS = {m: i for i, m in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+# logread:  "Sat Oct 17 00:38:22 2026 daemon.err btminer[123]: ..."
+# btminer:  "2026-10-17 00:38:22.123 ..." / "10-17 00:38:22 ..." (no year)
+_SYSLOG_LINE = re.compile(
+    r"\*?(?:[A-Z][a-z]{2} (?P<mon>[A-Z][a-z]{2}) +(?P<day>\d{1,2}) (?P<hms>\d\d:\d\d:\d\d) (?P<year>\d{4})"
+    r"|(?:(?P<iyear>\d{4})-)?(?P<md>\d\d-\d\d)[ T](?P<ihms>\d\d:\d\d:\d\d)(?:\.\d+)?)"
+    r"(?: \w+\.(?P<severity>[a-z]+))?"
+    r"(?: (?P<component>[^\s:\[]+)(?:\[\d+\])?:)?"
+)
+_ERROR_LEVELS = frozenset(("emerg", "alert", "crit", "err", "error"))
+_E_MARK = re.compile(r"\bE\b")
+_DAY_START_CACHE = {}
+
+
+def _day_start(year, month, day):
+    """Local midnight as unix time (one datetime call per distinct day)"""
+    key = (year, month, day)
+    start = _DAY_START_CACHE.get(key)
+    if start is None:
+        start = datetime(year, month, day).timestamp()
+        if len(_DAY_START_CACHE) < 4096:
+            _DAY_START_CACHE[key] = start
+    return start
+
+
+def parse_syslog_line(line, now=None):
+    """
+    One match at the start of a line -> (unix ts, severity, component);
+    ts is None for lines without a leading timestamp (e.g. continuations).
+    """
+    m = _SYSLOG_LINE.match(line)
+    if not m:
+        return None, None, None
+    try:
+        if m.group("hms"):
+            hms = m.group("hms")
+            month = _MONTHS[m.group("mon")]
+            year, day = int(m.group("year")), int(m.group("day"))
+        else:
+            hms, md = m.group("ihms"), m.group("md")
+            month, day = int(md[:2]), int(md[3:5])
+            now = now or time.time()
+            year = int(m.group("iyear") or datetime.fromtimestamp(now).year)
+        ts = _day_start(year, month, day) + int(hms[:2]) * 3600 + int(hms[3:5]) * 60 + int(hms[6:8])
+        if not m.group("hms") and not m.group("iyear") and ts > now + 86400:
+            # "MM-DD" of last December read in January
+            ts = _day_start(year - 1, month, day) + ts - _day_start(year, month, day)
+    except (KeyError, ValueError):
+        ts = None
+    return ts, m.group("severity"), m.group("component")
+
+
+def mark_error(line):
+    """Leading '*' on error lines (syslog error level or a standalone E)"""
+    m = _SYSLOG_LINE.match(line)
+    if (m and m.group("severity") in _ERROR_LEVELS) or _E_MARK.search(line):
+        return f"*{line}"
+    return line
+
+
+def timeline(miner, lines, now=None):
+    """
+    (ts, miner, line) for oldest-first lines of one miner; continuation lines
+    take the timestamp of the entry they belong to, so merging keeps them attached.
+    """
+    ts = 0.0
+    for ln in lines:
+        ts = parse_syslog_line(ln, now)[0] or ts
+        yield ts, miner, ln
+
+
+def _first_ts(lines, index, stop):
+    """(index, ts) of the first timestamped line in lines[index:stop], or (stop, None)"""
+    for i in range(index, stop):
+        ts = parse_syslog_line(lines[i])[0]
+        if ts is not None:
+            return i, ts
+    return stop, None
+
+
+def window_start(lines, cutoff):
+    """
+    Binary search over oldest-first syslog lines: index of the first line
+    logged at/after `cutoff`. Only O(log n) lines are parsed.
+    """
+    lo, hi = 0, len(lines)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        i, ts = _first_ts(lines, mid, hi)
+        if ts is not None and ts < cutoff:
+            # untimestamped lines up to i continue an older entry
+            lo = i + 1
+        else:
+            hi = mid
+    # untimestamped lines right at the start still belong to the entry before the cutoff
+    if lo > 0:
+        lo = _first_ts(lines, lo, len(lines))[0]
+    return lo
+
+
+# token groups in the order their index is sent to the browser (format="tokens")
+TOKEN_CLASSES = ['TIMESTAMP', 'ERROR', 'WARNING', 'SUCCESS', 'CT_CV', 'KEYWORDS', 'NUMBERS', 'BRACKETS']
+_TOKEN_INDEX = {name: i for i, name in enumerate(TOKEN_CLASSES)}
+# lines shown when a log has no timestamps to cut the time window from
+LOG_FALLBACK_LINES = 200
+# newest lines of a time window sent to the browser at most
+LOG_WINDOW_MAX_LINES = 5000
+# bytes read from the miner per step of a streamed syslog page
+LOG_STREAM_CHUNK = 32 * 1024
+# miners fetched at once for the merged timeline
+LOG_MERGE_WORKERS = BULK_MAX_WORKERS
+
+
+def word_class(word):
+    """Color group of a word (ERROR/WARNING/SUCCESS/CT_CV/KEYWORDS) or None"""
+    try:
+        return _WORD_CLASS_CACHE[word]
+    except KeyError:
+        pass
+    lower = word.lower()
+    group = None
+    for name, prefixes in STATUS_WORDS:
+        if lower.startswith(prefixes):
+            group = name
+            break
+    if group is None:
+        if lower == 'ok':
+            group = 'SUCCESS'
+        elif lower in ('ct', 'cv'):
+            group = 'CT_CV'
+        elif lower in _KEYWORD_SET:
+            group = 'KEYWORDS'
+    if len(_WORD_CLASS_CACHE) < 20000:
+        _WORD_CLASS_CACHE[word] = group
+    return group
+
+
+def ubus_entry_line(entry):
+    """{"time": epoch, "priority": n, "msg": ...} -> logread style line"""
+    ts = entry.get("time", 0)
+    # logd reports milliseconds; older builds seconds
+    if ts > 1e11:
+        ts /= 1000
+    stamp = datetime.fromtimestamp(ts).strftime("%a %b %d %H:%M:%S %Y")
+    priority = int(entry.get("priority", 6))
+    facility = priority >> 3
+    facility = _SYSLOG_FACILITIES[facility] if facility < len(_SYSLOG_FACILITIES) else "user"
+    return f"{stamp} {facility}.{_SYSLOG_LEVELS[priority & 7]} {entry.get('msg', '').rstrip()}"
+
+
+class LogWindow:
+    """
+    select_recent for lines arriving oldest first (streamed syslog page):
+    feed() returns the marked lines of the window found so far, finish() the
+    fallback tail when the log turned out to have no timestamps at all.
+    """
+
+    def __init__(self, cutoff):
+        self.cutoff = cutoff
+        self.inside = False
+        self.seen_ts = False
+        self._held = deque(maxlen=LOG_FALLBACK_LINES)
+
+    def feed(self, lines):
+        out = []
+        for ln in lines:
+            ts = parse_syslog_line(ln)[0]
+            if ts is not None:
+                if not self.seen_ts:
+                    self.seen_ts = True
+                    if ts >= self.cutoff:
+                        out.extend(mark_error(h) for h in self._held)
+                    self._held.clear()
+                self.inside = ts >= self.cutoff
+            elif not self.seen_ts:
+                self._held.append(ln)
+                continue
+            if self.inside:
+                out.append(mark_error(ln))
+        return out
+
+    def finish(self):
+        return [] if self.seen_ts else [mark_error(ln) for ln in self._held]
+
+
+class MinerLogCache:
+    """Raw syslog lines of one miner, extended with only the new lines on refresh"""
+
+    def __init__(self):
+        self.lines = []
+        self.fetched_at = 0.0
+        self.generation = 0  # bumped whenever the lines are replaced, not extended
+        self.appended = 0    # lines added by the last replace/merge
+        self.lock = threading.Lock()
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def replace(self, lines):
+        self.lines = lines[-LOG_CACHE_LINES:]
+        self.fetched_at = time.time()
+        self.generation += 1
+        self.appended = len(self.lines)
+        return self.appended
+
+    def merge(self, fresh):
+        """
+        Append the lines of `fresh` that follow the cached tail.
+        Returns the number of new lines, or None when `fresh` does not reach
+        back to the cached tail (too many new lines or the log was cleared).
+        """
+        if not self.lines:
+            return self.replace(fresh)
+        tail = self.lines[-LOG_OVERLAP_LINES:]
+        k = len(tail)
+        for i in range(len(fresh) - k, -1, -1):
+            if fresh[i:i + k] == tail:
+                new = fresh[i + k:]
+                self.lines.extend(new)
+                del self.lines[:-LOG_CACHE_LINES]
+                self.fetched_at = time.time()
+                self.appended = len(new)
+                return self.appended
+        return None
+
+# syslog page: the log is the body of a <textarea id="syslog"> (or a <pre> on older firmwares)
+_LOG_BLOCK_OPEN = re.compile(r"<(textarea|pre)\b[^>]*>", re.I)
+_INNER_TAG = re.compile(r"<[^>]*>")
+LOG_SCAN_CHUNK = 64 * 1024
+# longest opening tag kept while waiting for its '>'
+_MAX_TAG_LEN = 4096
+
+
+class SyslogTextExtractor:
+    """
+    Incremental syslog page scanner: feed() the HTML in chunks, lines()
+    returns the raw lines of the first textarea/pre block holding a log.
+    Only the current partial line (or tag) is buffered, never the page.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._close = None   # closing-tag regex while inside a block
+        self._strip_tags = False
+        self._block = []
+        self._block_len = 0
+        self._taken = 0
+        self._lines = None
+
+    def feed(self, chunk):
+        if self._lines is not None:
+            return
+        self._buf += chunk
+        while self._lines is None and self._buf:
+            if self._close is None:
+                if not self._seek_block():
+                    return
+            elif not self._read_block():
+                return
+
+    def _seek_block(self):
+        m = _LOG_BLOCK_OPEN.search(self._buf)
+        if not m:
+            # keep a possibly cut opening tag for the next chunk
+            lt = self._buf.rfind("<")
+            self._buf = self._buf[lt:] if lt != -1 and len(self._buf) - lt < _MAX_TAG_LEN else ""
+            return False
+        tag = m.group(1).lower()
+        self._close = re.compile(r"</%s\s*>" % tag, re.I)
+        self._strip_tags = tag == "pre"
+        self._block, self._block_len, self._taken = [], 0, 0
+        self._buf = self._buf[m.end():]
+        return True
+
+    def _read_block(self):
+        m = self._close.search(self._buf)
+        end = m.start() if m else self._buf.rfind("\n")
+        if end == -1:
+            return False
+        self._add_lines(self._buf[:end])
+        if not m:
+            self._buf = self._buf[end + 1:]
+            return False
+        self._buf = self._buf[m.end():]
+        self._close = None
+        # short blocks are form fields or notes, not the log
+        if self._block_len > 50:
+            self._lines = self._block
+            self._buf = ""
+        return True
+
+    def _add_lines(self, text):
+        # whole lines only: tags and entities never span a newline
+        if self._strip_tags:
+            text = _INNER_TAG.sub("", text)
+        if "&" in text:
+            text = html.unescape(text)
+        for ln in text.split("\n"):
+            ln = ln.strip()
+            self._block_len += len(ln)
+            if len(ln) > 5:
+                self._block.append(ln)
+
+    def finish(self):
+        """End of page: a cut-off log block still counts"""
+        if self._lines is None and self._close is not None:
+            self._add_lines(self._buf)
+            if self._block_len > 50:
+                self._lines = self._block
+        self._buf = ""
+
+    def lines(self):
+        """Lines of the log block, or None when no block was found"""
+        return self._lines
+
+    def take(self):
+        """Log lines completed since the last take() (streamed responses)"""
+        block = self._lines if self._lines is not None else self._block
+        # a block still open counts as the log once it is longer than a form field
+        if self._lines is None and (self._close is None or self._block_len <= 50):
+            return []
+        new = block[self._taken:]
+        self._taken = len(block)
+        return new
+
+
 class AdvancedLogsViewer:
     def __init__(self):
+        self._log_cache = {}  # miner -> MinerLogCache
+        self._cache_guard = threading.Lock()
+        self._listeners = []
         # رنگ‌ها و شمای رنگ‌بندی
         self.color_scheme = {
             'TIMESTAMP': '#6B7280',
@@ -25,76 +412,139 @@ class AdvancedLogsViewer:
             'WARNING': '#F59E0B',
             'SUCCESS': '#10B981'
         }
+        # opening <span> per token group of _LOG_TOKEN, built once
+        self._spans = {
+            name: f"<span style='color:{color};{'' if name == 'TIMESTAMP' else 'font-weight:bold;'}'>"
+            for name, color in self.color_scheme.items()
+        }
 
-    def get_syslog_via_https(self, ip, port, user, password, timeout_login=10, timeout_log=30):
-        """Try HTTPS then fallback to HTTP with increased timeouts"""
-        session = requests.Session()
-        
+    def read_log_ubus(self, base, user, password, lines, timeout=30):
+        """
+        Last `lines` syslog entries via rpcd `log read` (session id = LuCI cookie).
+        Returns a list of lines, or None when the miner does not offer it.
+        Only a definitive answer (no /ubus, no `log read`) turns ubus off for
+        the miner; other failures pause it for UBUS_RETRY_AFTER seconds.
+        """
+        entry, err = luci_sessions.session(base, user, password)
+        if not entry:
+            return None
+        sid = next((c.value for c in entry.http.cookies if c.name.startswith("sysauth")), None)
+        if not sid:
+            return None
+        payload = {"jsonrpc": "2.0", "id": 1, "method": "call",
+                   "params": [sid, "log", "read", {"lines": int(lines), "stream": False}]}
         try:
-            print(f"🆕 Creating new session for {ip}:{port}")
-            
-            # ۱. صفحه لاگین
-            login_url = f"https://{ip}:{port}/cgi-bin/luci"
-            r1 = session.get(login_url, verify=False, timeout=timeout_login)
-            print(f"📄 Login page status: {r1.status_code}")
-            print(f"🍪 Cookies after GET: {session.cookies.get_dict()}")
-            
-            # ۲. لاگین
-            login_data = {'luci_username': user, 'luci_password': password}
-            r2 = session.post(login_url, data=login_data, verify=False, timeout=timeout_login, allow_redirects=True)
-            print(f"🔐 Login status: {r2.status_code}")
-            print(f"🍪 Cookies after POST: {session.cookies.get_dict()}")
-            print(f"📏 Response length: {len(r2.text)}")
-            
-            # ۳. چک کن آیا لاگین موفق بود
-            if "Authorization Required" in r2.text:
+            resp, err = luci_sessions.request(base, user, password, "POST", UBUS_PATH, json=payload, timeout=timeout)
+        except requests.exceptions.RequestException:
+            self._ubus_failed(base)
+            raise
+        if err or resp.status_code != 200:
+            self._ubus_failed(base, missing=not err and resp.status_code == 404)
+            return None
+        try:
+            body = resp.json()
+            result = body.get("result") or []
+        except (ValueError, AttributeError):
+            body, result = {}, []
+        if len(result) < 2 or result[0] != 0:
+            # no rpcd method / ACL for `log read` - use the HTML page from now on;
+            # an expired session or a busy rpcd is only skipped for a while
+            error = body.get("error")
+            code = error.get("code") if isinstance(error, dict) else None
+            self._ubus_failed(base, missing=code == -32601 or bool(result) and result[0] in UBUS_MISSING)
+            return None
+        # only a log that converts cleanly makes ubus the source for this miner
+        try:
+            lines = [ubus_entry_line(e) for e in result[1].get("log", [])]
+        except (TypeError, ValueError, OverflowError, OSError, AttributeError) as e:
+            print(f"💥 Unexpected ubus log entry on {base}: {e}")
+            self._ubus_failed(base)
+            return None
+        luci_sessions.remember_layout(base, "syslog_ubus", True)
+        return lines
+
+    def _ubus_failed(self, base, missing=False):
+        if missing:
+            luci_sessions.remember_layout(base, "syslog_ubus", False)
+        else:
+            luci_sessions.remember_layout(base, "syslog_ubus", time.time() + UBUS_RETRY_AFTER)
+
+    def _ubus_available(self, base):
+        """Whether `log read` is worth trying on a miner (unknown, known good, or retry due)"""
+        state = luci_sessions.layout(base, "syslog_ubus")
+        if state is True or state is None:
+            return True
+        return state is not False and time.time() >= state
+
+    def get_syslog_lines(self, ip, port, user, password, timeout_log=30, tail=None):
+        """
+        Raw syslog lines (oldest first): ubus tail when available, otherwise
+        the full syslog page. Returns (lines, None) or (None, error string).
+        """
+        base = f"https://{ip}:{port}"
+        if self._ubus_available(base):
+            try:
+                lines = self.read_log_ubus(base, user, password, tail or LOG_CACHE_LINES, timeout=timeout_log)
+                if lines is not None:
+                    return lines, None
+            except Exception as e:
+                print(f"💥 ubus log read failed: {e}")
+
+        log_content = self.get_syslog_via_https(ip, port, user, password, timeout_log=timeout_log)
+        if not log_content or str(log_content).startswith(("ERROR_FETCHING_SYSLOG", "ERROR:")):
+            return None, log_content
+        return self.extract_syslog_lines(log_content), None
+
+    def get_syslog_via_https(self, ip, port, user, password, timeout_login=10, timeout_log=30):
+        """Try HTTPS then fallback to HTTP with increased timeouts (shared LuCI sessions)"""
+        last_error = None
+        for scheme in ("https", "http"):
+            base = f"{scheme}://{ip}:{port}"
+            try:
+                # session گرم دوباره استفاده می‌شود؛ لاگین فقط در صورت نبود/انقضا
+                r3, err = luci_sessions.request(base, user, password, "GET", SYSLOG_PATH, timeout=timeout_log)
+            except requests.exceptions.Timeout:
+                print("💥 Timeout error")
+                return "ERROR: Timeout - Log page is taking too long to load"
+            except Exception as e:
+                print(f"💥 Exception: {str(e)}")
+                last_error = e
+                continue
+
+            if err:
+                if err.startswith("GET login page failed"):
+                    if "timed out" in err.lower():
+                        return "ERROR: Timeout - Log page is taking too long to load"
+                    print(f"💥 {err}")
+                    last_error = err
+                    continue
                 print("❌ LOGIN FAILED - Still on login page")
                 return "ERROR: Login failed"
-            else:
-                print("✅ LOGIN SUCCESS - Redirected from login page")
-            
-            # ۴. صفحه syslog
-            syslog_url = f"https://{ip}:{port}/cgi-bin/luci/admin/status/syslog"
-            r3 = session.get(syslog_url, verify=False, timeout=timeout_log)
+
             print(f"📋 Syslog status: {r3.status_code}")
-            print(f"🍪 Final cookies: {session.cookies.get_dict()}")
-            
             if r3.status_code == 200:
                 print(f"✅ SUCCESS - Got {len(r3.text)} characters")
                 return r3.text
-            else:
-                print(f"❌ FAILED - Status {r3.status_code}")
-                # Fallback to log.cgi
-                try:
-                    log_url = f"https://{ip}:{port}/cgi-bin/log.cgi"
-                    r4 = session.get(log_url, verify=False, timeout=timeout_log)
-                    if r4.status_code == 200:
-                        return r4.text
-                except:
-                    pass
-                return f"ERROR: Status {r3.status_code}"
-                
-        except requests.exceptions.Timeout:
-            print("💥 Timeout error")
-            return "ERROR: Timeout - Log page is taking too long to load"
-        except Exception as e:
-            print(f"💥 Exception: {str(e)}")
-            # Fallback to HTTP
+
+            print(f"❌ FAILED - Status {r3.status_code}")
+            # Fallback to log.cgi
             try:
-                login_url = f"http://{ip}:{port}/cgi-bin/luci"
-                session.get(login_url, timeout=timeout_login)
-                session.post(login_url, data={'luci_username': user, 'luci_password': password}, timeout=timeout_login, allow_redirects=True)
-                log_url = f"http://{ip}:{port}/cgi-bin/luci/admin/status/syslog"
-                res = session.get(log_url, timeout=timeout_log)
-                return res.text
-            except Exception as e2:
-                return f"ERROR_FETCHING_SYSLOG: {e2}"
-
-    def get_miner_logs(self, miner_name, hours=2, miner_ip=None, port_map=None, miner_username=None, miner_password=None):
+                r4, _ = luci_sessions.request(base, user, password, "GET", "/cgi-bin/log.cgi", timeout=timeout_log)
+                if r4 is not None and r4.status_code == 200:
+                    return r4.text
+            except Exception:
+                pass
+            return f"ERROR: Status {r3.status_code}"
+
+        return f"ERROR_FETCHING_SYSLOG: {last_error}"
+
+    def get_miner_logs(self, miner_name, hours=2, miner_ip=None, port_map=None, miner_username=None, miner_password=None, fmt="html", limit=None):
         """
         Main facade called by main.py:
         - hours default = 2 (we keep usage for compatibility)
         - returns dict with status/message/logs/progress/count
+        - fmt="tokens": "lines" holds [text, starred, spans] per line instead of
+          the "logs" HTML (see tokenize_log_line)
         """
         try:
             if not miner_ip:
@@ -102,50 +552,371 @@ class AdvancedLogsViewer:
             if miner_name not in port_map:
                 return {"status": "error", "message": f"❌ Miner {miner_name} not found in port map", "logs": "", "progress": 100}
 
-            # افزایش تایم‌اوت برای ماینرهای سنگین
-            if miner_name in ['131', '132', '133']:
-                timeout_log = 45  # 45 ثانیه برای ماینرهای جدید
-            else:
-                timeout_log = 30  # 30 ثانیه برای ماینرهای قدیمی
-
-            port = port_map[miner_name]
-            log_content = self.get_syslog_via_https(miner_ip, port, miner_username, miner_password, timeout_log=timeout_log)
-
-            if log_content and not str(log_content).startswith("ERROR_FETCHING_SYSLOG") and "ERROR: Login failed" not in log_content:
-                logs = self.parse_real_syslog(log_content, hours, miner_name)
-                if logs:
-                    formatted_logs = self.format_logs_display(logs, miner_name, hours)
-                    return {
-                        "status": "success",
-                        "message": f"✅ Successfully loaded {len(logs)} log entries from {miner_name}",
-                        "logs": formatted_logs,
-                        "progress": 100,
-                        "count": len(logs)
-                    }
-                else:
-                    return {
-                        "status": "success",
-                        "message": f"📭 No logs found for {miner_name} in the last {hours} hours",
-                        "logs": f"📭 No logs found",
-                        "progress": 100,
-                        "count": 0
-                    }
-            else:
+            lines, source, note, err = self._cached_lines(miner_name, miner_ip, port_map[miner_name], miner_username, miner_password)
+            if err:
                 return {
                     "status": "error",
-                    "message": f"❌ Failed to fetch logs: {log_content}",
-                    "logs": f"Connection Error: {log_content}",
+                    "message": f"❌ Failed to fetch logs: {err}",
+                    "logs": f"Connection Error: {err}",
                     "progress": 100
                 }
+            tokens = fmt == "tokens"
+            logs = self.select_recent(lines, hours, min(int(limit or LOG_WINDOW_MAX_LINES), LOG_CACHE_LINES))
+            if tokens:
+                return {
+                    "status": "success",
+                    "message": (f"✅ Successfully loaded {len(logs)} log entries from {miner_name}{note}" if logs
+                                else f"📭 No logs found for {miner_name} in the last {hours} hours"),
+                    "format": "tokens",
+                    "miner": miner_name,
+                    "hours": hours,
+                    "classes": TOKEN_CLASSES,
+                    "lines": [self.tokenize_log_line(ln) for ln in logs],
+                    "progress": 100,
+                    "count": len(logs),
+                    "source": source
+                }
+            if logs:
+                formatted_logs = self.format_logs_display(logs, miner_name, hours)
+                return {
+                    "status": "success",
+                    "message": f"✅ Successfully loaded {len(logs)} log entries from {miner_name}{note}",
+                    "logs": formatted_logs,
+                    "progress": 100,
+                    "count": len(logs),
+                    "source": source
+                }
+            else:
+                return {
+                    "status": "success",
+                    "message": f"📭 No logs found for {miner_name} in the last {hours} hours",
+                    "logs": f"📭 No logs found",
+                    "progress": 100,
+                    "count": 0,
+                    "source": source
+                }
         except Exception as e:
             return {"status": "error", "message": f"💥 Unexpected error: {str(e)}", "logs": f"Critical error: {str(e)}", "progress": 100}
 
-    def parse_real_syslog(self, html_content, hours, miner_name):
+    def _cached_lines(self, miner_name, ip, port, user, password):
+        """Cached raw lines of a miner, refreshed when older than LOG_CACHE_TTL -> (lines, source, note, err)"""
+        cache = self._cache_for(miner_name)
+        with cache.lock:
+            source, note = "cache", ""
+            if not cache.lines or cache.age() >= LOG_CACHE_TTL:
+                source, note, err = self._refresh_cache(miner_name, cache, ip, port, user, password)
+                if err:
+                    return None, None, "", err
+            lines = list(cache.lines)
+            age = int(cache.age())
+        if source == "cache":
+            note = f" (cached {age}s ago)"
+        return lines, source, note, None
+
+    def get_merged_logs(self, miners, hours=2, miner_ip=None, port_map=None, miner_username=None, miner_password=None, limit=None):
+        """
+        Time window of several miners fetched in parallel and k-way merged by
+        timestamp (heapq.merge) into one timeline. Same shape as
+        get_miner_logs(fmt="tokens"); each line carries its miner as a 4th item
+        and "errors" maps the miners that could not be read to the reason.
+        """
+        try:
+            if not miner_ip:
+                return {"status": "error", "message": "❌ Miner IP not configured", "logs": "", "progress": 100}
+            miners = [m for m in dict.fromkeys(miners) if m in port_map]
+            if not miners:
+                return {"status": "error", "message": "❌ No known miners selected", "logs": "", "progress": 100}
+            limit = min(int(limit or LOG_WINDOW_MAX_LINES), LOG_CACHE_LINES)
+            started = time.monotonic()
+
+            def window(miner):
+                lines, _, _, err = self._cached_lines(miner, miner_ip, port_map[miner], miner_username, miner_password)
+                if err:
+                    raise RuntimeError(err)
+                return self.select_recent(lines, hours, limit)
+
+            windows, errors = {}, {}
+            for miner, lines, error in run_bulk(window, miners, LOG_MERGE_WORKERS):
+                if error:
+                    errors[miner] = error
+                else:
+                    windows[miner] = lines
+
+            now = time.time()
+            # newest `limit` entries of the merged timeline
+            merged = deque(heapq.merge(*(timeline(m, windows[m], now) for m in miners if m in windows),
+                                       key=lambda entry: entry[0]), maxlen=limit)
+            lines = [self.tokenize_log_line(ln) + [miner] for _, miner, ln in merged]
+
+            failed = f" ({len(errors)} failed: {', '.join(sorted(errors))})" if errors else ""
+            return {
+                "status": "success" if windows else "error",
+                "message": (f"✅ Merged {len(lines)} log entries from {len(windows)} miners{failed}" if lines
+                            else f"📭 No logs found in the last {hours} hours{failed}"),
+                "logs": "" if windows else "; ".join(f"{m}: {e}" for m, e in errors.items()),
+                "format": "tokens",
+                "miner": f"{len(windows)} miners" if len(miners) > 1 else miners[0],
+                "hours": hours,
+                "classes": TOKEN_CLASSES,
+                "lines": lines,
+                "errors": errors,
+                "progress": 100,
+                "count": len(lines),
+                "took_ms": round((time.monotonic() - started) * 1000, 1)
+            }
+        except Exception as e:
+            return {"status": "error", "message": f"💥 Unexpected error: {str(e)}", "logs": f"Critical error: {str(e)}", "progress": 100}
+
+    def stream_miner_logs(self, miner_name, hours=2, miner_ip=None, port_map=None, miner_username=None, miner_password=None, limit=None):
         """
-        - Extract text from HTML (search tags pre, textarea, code, div)
-        - Default time window is 'hours' but we keep simple: we return last 200 lines
-        - Mark lines containing 'E' with leading '*'
+        get_miner_logs(fmt="tokens") as events for a chunked response:
+          {"type": "start", "miner", "hours", "classes", "limit"}
+          {"type": "progress", "stage", "received", "total"}  syslog page bytes (total None = unknown)
+          {"type": "lines", "lines"}                         tokenized lines to append
+          {"type": "reset"}                                  drop the lines sent so far
+          {"type": "done", "status", "message", "count", "source"} or {"type": "error", "message", "logs"}
+        A warm cache is sent at once and topped up with the new lines; a cold
+        one is filled while the syslog page downloads. The fetch runs on its
+        own thread under the cache lock, so a slow reader never holds the lock.
         """
+        if not miner_ip:
+            yield {"type": "error", "message": "❌ Miner IP not configured", "logs": ""}
+            return
+        if miner_name not in port_map:
+            yield {"type": "error", "message": f"❌ Miner {miner_name} not found in port map", "logs": ""}
+            return
+        try:
+            limit = min(int(limit or LOG_WINDOW_MAX_LINES), LOG_CACHE_LINES)
+        except (TypeError, ValueError):
+            limit = LOG_WINDOW_MAX_LINES
+        yield {"type": "start", "miner": miner_name, "hours": hours, "classes": TOKEN_CLASSES, "limit": limit}
+
+        events = queue.Queue()
+        threading.Thread(target=self._fill_stream, daemon=True, args=(
+            events, miner_name, hours, limit, miner_ip, port_map[miner_name], miner_username, miner_password)).start()
+        sent = 0
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            if event["type"] == "lines":
+                sent += len(event["lines"])
+            elif event["type"] == "reset":
+                sent = 0
+            elif event["type"] == "done":
+                count = min(sent, limit)
+                event.update(status="success", count=count, message=(
+                    f"✅ Successfully loaded {count} log entries from {miner_name}{event.pop('note')}" if count
+                    else f"📭 No logs found for {miner_name} in the last {hours} hours"))
+            yield event
+
+    def _fill_stream(self, events, miner_name, *args):
+        """Put the stream events of a miner into `events` (None when finished)"""
+        cache = self._cache_for(miner_name)
+        try:
+            with cache.lock:
+                fill = self._stream_warm if cache.lines else self._stream_cold
+                for event in fill(miner_name, cache, *args):
+                    events.put(event)
+        except Exception as e:
+            events.put({"type": "error", "message": f"💥 Unexpected error: {str(e)}", "logs": f"Critical error: {str(e)}"})
+        finally:
+            events.put(None)
+
+    def _lines_event(self, lines):
+        return {"type": "lines", "lines": [self.tokenize_log_line(ln) for ln in lines]}
+
+    def _stream_warm(self, miner_name, cache, hours, limit, ip, port, user, password):
+        """Cached window first, then only what the refresh added"""
+        yield self._lines_event(self.select_recent(cache.lines, hours, limit))
+        if cache.age() < LOG_CACHE_TTL:
+            yield {"type": "done", "source": "cache", "note": f" (cached {int(cache.age())}s ago)"}
+            return
+        yield {"type": "progress", "stage": "Fetching new lines...", "received": 0, "total": None}
+        generation, fetched_at = cache.generation, cache.fetched_at
+        source, note, _ = self._refresh_cache(miner_name, cache, ip, port, user, password)
+        if cache.generation != generation:
+            # the log was cleared or rotated past the cached tail
+            yield {"type": "reset"}
+            yield self._lines_event(self.select_recent(cache.lines, hours, limit))
+        elif cache.fetched_at != fetched_at and cache.appended:
+            yield self._lines_event(self.select_recent(cache.lines[-cache.appended:], hours, limit))
+        yield {"type": "done", "source": source, "note": note}
+
+    def _stream_cold(self, miner_name, cache, hours, limit, ip, port, user, password):
+        """Empty cache: ubus tail when offered, otherwise the syslog page as it downloads"""
+        try:
+            hours_f = float(hours)
+        except (TypeError, ValueError):
+            hours_f = 2
+        base = f"https://{ip}:{port}"
+        timeout_log = self._log_timeout(miner_name)
+        lines = None
+        # a dead miner or a rejected login ends the stream here instead of
+        # after every fallback has timed out; an SSL error means plain http
+        entry, err = luci_sessions.session(base, user, password)
+        if err and "SSL" not in err:
+            yield {"type": "error", "message": f"❌ Failed to fetch logs: {err}", "logs": f"Connection Error: {err}"}
+            return
+        if entry and self._ubus_available(base):
+            yield {"type": "progress", "stage": "Reading log via ubus...", "received": 0, "total": None}
+            try:
+                lines = self.read_log_ubus(base, user, password, LOG_CACHE_LINES, timeout=timeout_log)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                yield {"type": "error", "message": f"❌ Failed to fetch logs: {e}", "logs": f"Connection Error: {e}"}
+                return
+            except Exception as e:
+                print(f"💥 ubus log read failed: {e}")
+
+        if lines is None:
+            lines = []
+            window = LogWindow(time.time() - hours_f * 3600)
+            try:
+                if entry:
+                    for kind, data, total in self.stream_syslog_page(ip, port, user, password, timeout_log):
+                        if kind == "progress":
+                            yield {"type": "progress", "stage": "Downloading syslog...", "received": data, "total": total}
+                            continue
+                        lines.extend(data)
+                        shown = window.feed(data)
+                        if shown:
+                            yield self._lines_event(shown)
+            except Exception as e:
+                yield {"type": "error", "message": f"❌ Failed to fetch logs: {e}", "logs": f"Connection Error: {e}"}
+                return
+            if lines:
+                tail = window.finish()
+                if tail:
+                    yield self._lines_event(tail)
+            else:
+                # no textarea/pre log, page not found or plain-http miner - the regular path handles those
+                yield {"type": "progress", "stage": "Retrying...", "received": 0, "total": None}
+                lines, err = self.get_syslog_lines(ip, port, user, password, timeout_log)
+                if err:
+                    yield {"type": "error", "message": f"❌ Failed to fetch logs: {err}", "logs": f"Connection Error: {err}"}
+                    return
+                yield self._lines_event(self.select_recent(lines, hours, limit))
+        else:
+            yield self._lines_event(self.select_recent(lines, hours, limit))
+
+        self._publish(miner_name, cache, cache.replace(lines))
+        yield {"type": "done", "source": "miner", "note": ""}
+
+    def stream_syslog_page(self, ip, port, user, password, timeout_log=30):
+        """
+        Download the syslog page in chunks, yielding ("progress", received
+        bytes, Content-Length or None) and ("lines", raw lines, None) as the
+        log block comes in. Nothing is yielded as lines when the page has no
+        textarea/pre log or does not load (non-200); errors are raised.
+        """
+        base = f"https://{ip}:{port}"
+        resp, err = luci_sessions.request(base, user, password, "GET", SYSLOG_PATH, timeout=timeout_log, stream=True)
+        if err:
+            raise RuntimeError(err)
+        try:
+            if resp.status_code != 200:
+                print(f"❌ Syslog page status {resp.status_code}")
+                return
+            total = resp.headers.get("Content-Length", "")
+            total = int(total) if total.isdigit() else None
+            decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+            scanner = SyslogTextExtractor()
+            received = 0
+            deadline = time.monotonic() + timeout_log
+            for chunk in resp.iter_content(LOG_STREAM_CHUNK):
+                received += len(chunk)
+                scanner.feed(decoder.decode(chunk))
+                yield "progress", received, total
+                lines = scanner.take()
+                if lines:
+                    yield "lines", lines, None
+                if scanner.lines() is not None:
+                    return
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Timeout - Log page is taking too long to load")
+            scanner.feed(decoder.decode(b"", final=True))
+            scanner.finish()
+            lines = scanner.take()
+            if lines:
+                yield "lines", lines, None
+        finally:
+            resp.close()
+
+    def subscribe(self, callback):
+        """callback(miner_name, new_lines) runs after every fetch that found new lines"""
+        self._listeners.append(callback)
+
+    def refresh_miner(self, miner_name, miner_ip, port_map, miner_username, miner_password):
+        """Pull new syslog lines of one miner into its cache (background collectors). Returns an error or None."""
+        if miner_name not in port_map:
+            return f"Miner {miner_name} not found in port map"
+        cache = self._cache_for(miner_name)
+        with cache.lock:
+            _, _, err = self._refresh_cache(miner_name, cache, miner_ip, port_map[miner_name], miner_username, miner_password)
+        return err
+
+    def _log_timeout(self, miner_name):
+        # افزایش تایم‌اوت برای ماینرهای سنگین
+        if miner_name in ['131', '132', '133']:
+            return 45  # 45 ثانیه برای ماینرهای جدید
+        return 30  # 30 ثانیه برای ماینرهای قدیمی
+
+    def _cache_for(self, miner_name):
+        with self._cache_guard:
+            cache = self._log_cache.get(miner_name)
+            if cache is None:
+                cache = self._log_cache[miner_name] = MinerLogCache()
+            return cache
+
+    def _refresh_cache(self, miner_name, cache, ip, port, user, password):
+        """
+        Bring a miner's cache up to date. Returns (source, note, error); on a
+        failed fetch with a warm cache the old lines are served instead.
+        """
+        timeout_log = self._log_timeout(miner_name)
+        warm = bool(cache.lines)
+        # with a warm cache only the newest entries are asked for
+        lines, err = self.get_syslog_lines(ip, port, user, password, timeout_log, tail=LOG_TAIL_LINES if warm else None)
+        if err:
+            if warm:
+                return "cache", f" (⚠️ refresh failed, showing logs from {int(cache.age())}s ago)", None
+            return None, "", err
+        new = cache.merge(lines)
+        if new is None:
+            if len(lines) >= LOG_TAIL_LINES:
+                # more new lines than the tail held - fetch everything once
+                full, err = self.get_syslog_lines(ip, port, user, password, timeout_log)
+                lines = full or lines
+            new = cache.replace(lines)
+        self._publish(miner_name, cache, new)
+        return "miner", f" ({new} new lines)" if warm else "", None
+
+    def _publish(self, miner_name, cache, new):
+        """Hand the `new` newest cached lines to the subscribers"""
+        if not new:
+            return
+        new_lines = cache.lines[-new:]
+        for callback in list(self._listeners):
+            try:
+                callback(miner_name, new_lines)
+            except Exception as e:
+                print(f"💥 Log listener failed: {e}")
+
+    def extract_syslog_lines(self, html_content):
+        """Syslog page HTML -> raw non-empty lines (oldest first)"""
+        scanner = SyslogTextExtractor()
+        for pos in range(0, len(html_content), LOG_SCAN_CHUNK):
+            scanner.feed(html_content[pos:pos + LOG_SCAN_CHUNK])
+            if scanner.lines() is not None:
+                return scanner.lines()
+        scanner.finish()
+        if scanner.lines() is not None:
+            return scanner.lines()
+        # unusual markup (log in a <code>/<div>) - fall back to the DOM
+        return self.extract_syslog_lines_dom(html_content)
+
+    def extract_syslog_lines_dom(self, html_content):
+        """BeautifulSoup variant of extract_syslog_lines for pages without a textarea/pre log"""
         try:
             soup = BeautifulSoup(html_content, 'html.parser')
             syslog_content = None
@@ -161,40 +932,39 @@ class AdvancedLogsViewer:
                 return []
 
             # split and clean
-            lines = [ln.strip() for ln in syslog_content.split('\n') if ln.strip() and len(ln.strip()) > 5]
+            return [ln.strip() for ln in syslog_content.split('\n') if ln.strip() and len(ln.strip()) > 5]
+        except Exception:
+            return []
 
-            # Attempt optional time filter (if timestamps in format MM-DD HH:MM:SS.*) to keep recent - but always fallback to last 200
-            try:
-                now = datetime.now()
-                cutoff = now - timedelta(hours=hours)
-                recent = []
-                for ln in lines:
-                    m = re.search(r'(\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)', ln)
-                    if m:
-                        # assume current year for parsing
-                        try:
-                            t = datetime.strptime(f"{now.year}-{m.group(1)}", "%Y-%m-%d %H:%M:%S.%f")
-                        except Exception:
-                            try:
-                                t = datetime.strptime(f"{now.year}-{m.group(1)}", "%Y-%m-%d %H:%M:%S")
-                            except Exception:
-                                t = None
-                        if t and t >= cutoff:
-                            recent.append(ln)
-                if len(recent) >= 10:
-                    chosen = recent[-200:]
-                else:
-                    chosen = lines[-200:]
-            except Exception:
-                chosen = lines[-200:]
+    def parse_real_syslog(self, html_content, hours, miner_name):
+        """
+        - Extract text from HTML (textarea/pre scan, DOM search as fallback)
+        - Keep exactly the last 'hours' (see select_recent)
+        - Mark error lines with leading '*'
+        """
+        return self.select_recent(self.extract_syslog_lines(html_content), hours)
 
-            # Mark lines containing 'E' with leading * (only standalone E)
-            for i, ln in enumerate(chosen):
-                if re.search(r'\bE\b', ln):
-                    chosen[i] = f"*{ln}"
-            return chosen
-        except Exception:
+    def select_recent(self, lines, hours, limit=None, now=None):
+        """
+        Raw syslog lines (oldest first) logged within the last `hours`, marked
+        for display. Without any timestamps the last LOG_FALLBACK_LINES lines
+        are used; `limit` keeps only the newest lines of the window.
+        """
+        try:
+            hours = float(hours)
+        except (TypeError, ValueError):
+            hours = 2
+        if not lines:
             return []
+        now = now or time.time()
+        if _first_ts(lines, 0, len(lines))[1] is None:
+            chosen = lines[-(limit or LOG_FALLBACK_LINES):]
+        else:
+            chosen = lines[window_start(lines, now - hours * 3600):]
+            if limit:
+                chosen = chosen[-limit:]
+
+        return [mark_error(ln) for ln in chosen]
 
     def format_logs_display(self, logs, miner_name, hours):
         """Return HTML formatted logs (numbered + colored)"""
@@ -215,71 +985,85 @@ class AdvancedLogsViewer:
         return header + "\n".join(colored_lines)
 
     def colorize_log_line(self, line):
-        """Apply coloring:
-           - numbers -> NUMBERS
+        """Apply coloring in one pass over the raw line:
+           - timestamps -> TIMESTAMP
+           - status words -> ERROR/WARNING/SUCCESS
            - ct/cv -> CT_CV (green)
            - mining keywords -> KEYWORDS (blue)
-           - status words -> ERROR/WARNING/SUCCESS
-           - timestamps -> TIMESTAMP
+           - numbers -> NUMBERS
            - brackets -> BRACKETS
+           Text is escaped piece by piece, so markup is never matched again.
         """
         if not line:
             return line
 
-        # escape HTML entities minimally
-        safe = (line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;"))
+        spans = self._spans
         # keep the leading '*' if exists visible
         leading_star = ''
-        if safe.startswith('*'):
+        if line.startswith('*'):
             leading_star = '<span style="color:%s;font-weight:bold;">*</span> ' % self.color_scheme['ERROR']
-            safe = safe[1:]
+            line = line[1:]
 
         # put in brackets visually
-        bracketed = f"[{safe}]"
-
-        # color numbers
-        colored = re.sub(r'(\d+\.\d+|\d+)', lambda m: f"<span style='color:{self.color_scheme['NUMBERS']};font-weight:bold;'>{m.group(1)}</span>", bracketed)
-
-        # ct / cv green (word boundaries)
-        colored = re.sub(r'\b(ct:|cv:|ct|cv)\b', lambda m: f"<span style='color:{self.color_scheme['CT_CV']};font-weight:bold;'>{m.group(1)}</span>", colored, flags=re.IGNORECASE)
-
-        # mining keywords blue (other keywords)
-        mining_keywords = [
-            'btminer','bt','env','fan','ac','pin','vout','chain','temp','temperature',
-            'frequency','voltage','power','hashrate','kernel','miner','pool','asic','bitmain','antminer',
-            'speed','rpm','watts','volts','mhz','ghz','th/s','gh/s','mh/s'
-        ]
-        for kw in mining_keywords:
-            colored = re.sub(r'\b' + re.escape(kw) + r'\b', lambda m: f"<span style='color:{self.color_scheme['KEYWORDS']};font-weight:bold;'>{m.group(0)}</span>", colored, flags=re.IGNORECASE)
-
-        # status words coloring
-        status_patterns = [
-            (r'(error|failed|failure|crash|panic|fault|unable|cannot|timeout)', self.color_scheme['ERROR']),
-            (r'(warn|warning|alert|notice|attention|caution)', self.color_scheme['WARNING']),
-            (r'(success|completed|ready|online|started|connected|ok|running|active)', self.color_scheme['SUCCESS'])
-        ]
-        for pat, col in status_patterns:
-            colored = re.sub(pat, lambda m: f"<span style='color:{col};font-weight:bold;'>{m.group(0)}</span>", colored, flags=re.IGNORECASE)
-
-        # timestamps gray-ish
-        timestamp_patterns = [
-            r'(\w{3} \d{1,2} \d{2}:\d{2}:\d{2})',
-            r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})',
-            r'(\d{2}-\d{2} \d{2}:\d{2}:\d{2})',
-            r'(\d{2}:\d{2}:\d{2})'
-        ]
-        for pat in timestamp_patterns:
-            colored = re.sub(pat, lambda m: f"<span style='color:{self.color_scheme['TIMESTAMP']};'>{m.group(1)}</span>", colored)
-
-        # color brackets
-        colored = colored.replace('[', f"<span style='color:{self.color_scheme['BRACKETS']};font-weight:bold;'>[</span>")
-        colored = colored.replace(']', f"<span style='color:{self.color_scheme['BRACKETS']};font-weight:bold;'>]</span>")
-
-        return leading_star + colored
+        out = [spans['BRACKETS'], '[</span>']
+        pos = 0
+        for m in _LOG_TOKEN.finditer(line):
+            group = m.lastgroup
+            if group == 'WORD':
+                group = word_class(m.group())
+                if group is None:
+                    continue  # plain word - stays in the text between tokens
+            start = m.start()
+            if start > pos:
+                out.append(html.escape(line[pos:start], quote=False))
+            out.append(spans[group])
+            out.append(html.escape(m.group(), quote=False))
+            out.append('</span>')
+            pos = m.end()
+        if pos < len(line):
+            out.append(html.escape(line[pos:], quote=False))
+        out.append(spans['BRACKETS'])
+        out.append(']</span>')
+        return leading_star + ''.join(out)
+
+    def tokenize_log_line(self, line):
+        """
+        Compact form for the browser: [text, starred, spans] where spans is a
+        flat list [start, end, class index, ...] into TOKEN_CLASSES.
+        """
+        starred = 0
+        if line.startswith('*'):
+            starred = 1
+            line = line[1:]
+        spans = []
+        for m in _LOG_TOKEN.finditer(line):
+            group = m.lastgroup
+            if group == 'WORD':
+                group = word_class(m.group())
+                if group is None:
+                    continue
+            spans.extend((m.start(), m.end(), _TOKEN_INDEX[group]))
+        return [line, starred, spans]
+
+    def token_css(self):
+        """CSS classes .lg-<group> for the token view, from the color scheme"""
+        rules = []
+        for name in TOKEN_CLASSES:
+            weight = '' if name == 'TIMESTAMP' else 'font-weight:bold;'
+            rules.append(f".lg-{name.lower()}{{color:{self.color_scheme[name]};{weight}}}")
+        return "\n".join(rules)
 
     def get_logs_html(self):
         """Return complete logs modal HTML with management buttons"""
         return '''
+        <style>
+        #logsOutput .lg-row { height:18px; line-height:18px; white-space:pre; overflow:hidden; color:#10B981; }
+        #logsOutput .lg-num { color:#6B7280; font-weight:bold; }
+        #logsOutput .lg-header { font-weight:bold; margin-bottom:12px; padding-bottom:8px; border-bottom:1px solid #e5e7eb; color:#3B82F6; }
+        #logsOutput .lg-miner { color:#A78BFA; font-weight:bold; }
+        ''' + self.token_css() + '''
+        </style>
+
         <!-- Logs Modal -->
         <div id="logsModalOverlay" class="modal-overlay" onclick="closeLogsModal()"></div>
         <div id="logsModal" class="modal" style="max-width:95%;width:95%;max-height:90vh;">
@@ -311,6 +1095,11 @@ class AdvancedLogsViewer:
                         <option value="131">Miner 131</option>
                         <option value="132">Miner 132</option>
                         <option value="133">Miner 133</option>
+                        <optgroup label="Merged timeline">
+                            <option value="*">🌐 All miners</option>
+                            <option value="131,132,133">Miners 131-133</option>
+                            <option value="65,66,70">Miners 65-70</option>
+                        </optgroup>
                     </select>
                 </div>
                 <div style="flex:1;min-width:150px;">
@@ -347,9 +1136,106 @@ class AdvancedLogsViewer:
         </div>
 
         <script>
-        function copyLogsToClipboard() {
+        // token view: only the rows inside the viewport are in the DOM
+        const LOG_ROW_HEIGHT = 18;
+        let logView = null;  // {lines, classes, spacer, win, first, last}
+
+        function escapeLogText(text) {
+            return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        }
+
+        function logLineHtml(line, idx, classes) {
+            const text = line[0], spans = line[2];
+            let html = '<span class="lg-num">' + String(idx + 1).padStart(4, ' ') + '.</span> ';
+            if (line[3]) html += '<span class="lg-miner">[' + escapeLogText(line[3]) + ']</span> ';
+            if (line[1]) html += '<span class="lg-error">*</span> ';
+            let pos = 0;
+            for (let i = 0; i < spans.length; i += 3) {
+                if (spans[i] > pos) html += escapeLogText(text.slice(pos, spans[i]));
+                html += '<span class="lg-' + classes[spans[i + 2]] + '">' + escapeLogText(text.slice(spans[i], spans[i + 1])) + '</span>';
+                pos = spans[i + 1];
+            }
+            return html + escapeLogText(text.slice(pos));
+        }
+
+        function drawLogWindow(output) {
+            if (!logView || !logView.spacer.isConnected) return;
+            const top = output.scrollTop - logView.spacer.offsetTop;
+            const first = Math.max(0, Math.floor(top / LOG_ROW_HEIGHT) - 20);
+            const last = Math.min(logView.lines.length, first + Math.ceil(output.clientHeight / LOG_ROW_HEIGHT) + 40);
+            if (first === logView.first && last === logView.last) return;
+            logView.first = first;
+            logView.last = last;
+            const rows = [];
+            for (let i = first; i < last; i++) {
+                rows.push('<div class="lg-row">' + logLineHtml(logView.lines[i], i, logView.classes) + '</div>');
+            }
+            logView.win.style.top = (first * LOG_ROW_HEIGHT) + 'px';
+            logView.win.innerHTML = rows.join('');
+        }
+
+        function logHeaderText() {
+            return `📋 Logs for Miner ${logView.miner} (Last ${logView.hours} hours) - ${logView.lines.length} entries`;
+        }
+
+        function renderLogLines(output, data) {
+            const header = document.createElement('div');
+            header.className = 'lg-header';
+            const spacer = document.createElement('div');
+            spacer.style.position = 'relative';
+            spacer.style.height = (data.lines.length * LOG_ROW_HEIGHT) + 'px';
+            const win = document.createElement('div');
+            win.style.position = 'absolute';
+            win.style.left = '0';
+            win.style.right = '0';
+            spacer.appendChild(win);
+
+            output.innerHTML = '';
+            output.appendChild(header);
+            output.appendChild(spacer);
+            logView = {
+                lines: data.lines,
+                classes: data.classes.map(c => c.toLowerCase()),
+                miner: data.miner, hours: data.hours, limit: data.limit || 0,
+                header: header, spacer: spacer, win: win, first: -1, last: -1
+            };
+            header.textContent = logHeaderText();
+            output.onscroll = () => drawLogWindow(output);
+            output.scrollTop = output.scrollHeight;
+            drawLogWindow(output);
+        }
+
+        // streamed loads: lines arrive in batches after renderLogLines() set up an empty view
+        function appendLogLines(output, lines) {
+            if (!logView || !logView.spacer.isConnected) return;
+            const atBottom = output.scrollTop + output.clientHeight >= output.scrollHeight - LOG_ROW_HEIGHT;
+            for (let i = 0; i < lines.length; i++) logView.lines.push(lines[i]);
+            if (logView.limit && logView.lines.length > logView.limit) {
+                logView.lines.splice(0, logView.lines.length - logView.limit);
+            }
+            logView.spacer.style.height = (logView.lines.length * LOG_ROW_HEIGHT) + 'px';
+            logView.header.textContent = logHeaderText();
+            logView.first = logView.last = -1;
+            if (atBottom) output.scrollTop = output.scrollHeight;
+            drawLogWindow(output);
+        }
+
+        function resetLogLines(output) {
+            if (!logView) return;
+            logView.lines.length = 0;
+            appendLogLines(output, []);
+        }
+
+        function currentLogsText() {
+            if (logView && logView.spacer.isConnected) {
+                return logView.lines.map(l => (l[3] ? '[' + l[3] + '] ' : '') + (l[1] ? '*' : '') + l[0]).join('\\n');
+            }
             const logsOutput = document.getElementById('logsOutput');
-            const text = logsOutput.innerText || logsOutput.textContent;
+            return logsOutput.innerText || logsOutput.textContent;
+        }
+
+        function copyLogsToClipboard() {
+            const text = currentLogsText();
             
             navigator.clipboard.writeText(text).then(function() {
                 showTemporaryMessage('✅ Logs copied to clipboard!', 'success');
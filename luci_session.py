@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+luci_session.py - Shared, authenticated LuCI sessions for pools_manager,
+reboot, NTP and logs_viewer.
+
+One requests.Session per miner is logged in once and reused (keep-alive
+HTTPS pool via HTTPAdapter). Expired sessions are detected from the response
+(login form / 403) or by age and re-logged transparently. A lock per miner
+serialises multi-step actions (GET token -> POST form) on the same session.
+
+The CSRF token LuCI puts in its forms belongs to the login session, so it is
+cached on the session and only re-read from a page after a failed POST or a
+new login. Firmware details found on a page (which form fields exist, which
+POST body a call accepts) are cached per miner and survive re-logins.
+"""
+
+import html as htmllib
+import re
+import threading
+import time
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# LuCI's default sessiontime is 3600 s - renew a little earlier
+LUCI_SESSION_MAX_AGE = 3000
+LOGIN_TIMEOUT = 10
+
+_STOK_RE = re.compile(r";stok=([0-9a-fA-F]+)")
+_INPUT_TAG = re.compile(r"<input\b[^>]*>", re.I)
+_TAG_ATTR = re.compile(r"""([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+# reboot page: XHR.get(..., { token: '...' })
+_SCRIPT_TOKEN = re.compile(r"""token\s*:\s*(?:'([^']*)'|"([^"]*)")""")
+
+
+def input_value(html, name="token"):
+    """
+    value="" of the first <input name=...> in a page, without building a DOM.
+    The scan stops at the first matching tag.
+    """
+    for m in _INPUT_TAG.finditer(html):
+        tag = m.group(0)
+        if name not in tag:
+            continue
+        attrs = {a.lower(): v1 or v2 or v3 for a, v1, v2, v3 in _TAG_ATTR.findall(tag)}
+        if attrs.get("name") == name:
+            return htmllib.unescape(attrs.get("value", ""))
+    return None
+
+
+def script_token(html):
+    """`token: '...'` literal of a LuCI page script (e.g. the reboot page)"""
+    # str.find jumps between candidates much faster than a regex search
+    pos = html.find("token")
+    while pos != -1:
+        m = _SCRIPT_TOKEN.match(html, pos)
+        if m:
+            return m.group(1) or m.group(2) or None
+        pos = html.find("token", pos + 5)
+    return None
+
+
+def is_login_page(response, read_body=True):
+    """
+    True when LuCI answered with its login form instead of the page.
+    read_body=False (streamed responses) checks the status only.
+    """
+    if response is None:
+        return False
+    if response.status_code == 403:
+        return True
+    if not read_body:
+        return False
+    ctype = response.headers.get("Content-Type", "")
+    if "html" not in ctype and ctype:
+        return False
+    text = response.text
+    return 'name="luci_password"' in text or "Authorization Required" in text
+
+
+class LuciSession:
+    def __init__(self, base, http, stok=None):
+        self.base = base
+        self.http = http
+        self.stok = stok
+        self.token = None  # CSRF token, valid for this login only
+        self.created = time.time()
+        self.last_used = self.created
+
+    def expired(self, max_age=LUCI_SESSION_MAX_AGE):
+        return time.time() - self.created > max_age
+
+    def url(self, path):
+        """Absolute URL for a /cgi-bin/luci/... path (with ;stok= when the firmware uses it)"""
+        if self.stok and path.startswith("/cgi-bin/luci"):
+            path = "/cgi-bin/luci/;stok=" + self.stok + path[len("/cgi-bin/luci"):]
+        return self.base + path
+
+
+def _new_http_session():
+    s = requests.Session()
+    s.verify = False
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+class LuciSessionPool:
+    def __init__(self, max_age=LUCI_SESSION_MAX_AGE):
+        self.max_age = max_age
+        self._entries = {}  # (base, username) -> LuciSession
+        self._locks = {}    # base -> RLock
+        self._layouts = {}  # base -> {key: value} discovered firmware form layout
+        self._guard = threading.Lock()
+
+    def lock(self, base):
+        """Per-miner lock; hold it around GET token -> POST sequences"""
+        with self._guard:
+            lk = self._locks.get(base)
+            if lk is None:
+                lk = self._locks[base] = threading.RLock()
+            return lk
+
+    def _login(self, base, username, password, timeout):
+        http = _new_http_session()
+        login_url = f"{base}/cgi-bin/luci"
+        try:
+            # some firmwares need the initial GET for cookies
+            http.get(login_url, verify=False, timeout=timeout)
+        except Exception as e:
+            return None, f"GET login page failed: {e}"
+
+        payloads = [
+            {"luci_username": username, "luci_password": password},
+            {"username": username, "password": password},
+        ]
+        last_error = "Login failed with all payloads"
+        for payload in payloads:
+            try:
+                resp = http.post(login_url, data=payload, verify=False, timeout=timeout, allow_redirects=False)
+            except Exception as e:
+                last_error = f"Login error: {e}"
+                continue
+            if resp.status_code in (302, 303) or (resp.status_code == 200 and not is_login_page(resp)):
+                m = _STOK_RE.search(resp.headers.get("Location", "") or "")
+                print(f"✅ LuCI login to {base}")
+                return LuciSession(base, http, m.group(1) if m else None), None
+            last_error = f"Login failed - Status: {resp.status_code}"
+        return None, last_error
+
+    def session(self, base, username, password, timeout=LOGIN_TIMEOUT, fresh=False):
+        """Warm session for a miner (logs in only when missing/expired/fresh)"""
+        key = (base, username)
+        entry = self._entries.get(key)
+        if entry and not fresh and not entry.expired(self.max_age):
+            return entry, None
+        with self.lock(base):
+            entry = self._entries.get(key)
+            if entry and not fresh and not entry.expired(self.max_age):
+                return entry, None
+            entry, err = self._login(base, username, password, timeout)
+            if entry:
+                self._entries[key] = entry
+            else:
+                self._entries.pop(key, None)
+            return entry, err
+
+    def invalidate(self, base, username=None):
+        with self.lock(base):
+            for key in [k for k in self._entries if k[0] == base and (username is None or k[1] == username)]:
+                self._entries.pop(key, None)
+
+    def token(self, base, username, password, path, extract, timeout=10, reload=False):
+        """
+        CSRF token of the current session. Served from the cache when known
+        (and not `reload`), otherwise `path` is loaded and extract(html) -> token
+        is applied.
+        Returns (token, html, err); html is None when the cache answered.
+        """
+        with self.lock(base):
+            entry, err = self.session(base, username, password)
+            if not entry:
+                return None, None, err
+            if entry.token and not reload:
+                return entry.token, None, None
+            resp, err = self.request(base, username, password, "GET", path, timeout=timeout)
+            if err:
+                return None, None, err
+            if resp.status_code != 200:
+                return None, None, f"Page load error: {resp.status_code}"
+            token = extract(resp.text)
+            # the GET may have logged in again - keep the token on the live session
+            current = self._entries.get((base, username))
+            if token and current:
+                current.token = token
+            return token, resp.text, None
+
+    def forget_token(self, base, username=None):
+        """Drop cached tokens after a rejected POST"""
+        with self.lock(base):
+            for key, entry in self._entries.items():
+                if key[0] == base and (username is None or key[1] == username):
+                    entry.token = None
+
+    def layout(self, base, key, default=None):
+        return self._layouts.get(base, {}).get(key, default)
+
+    def remember_layout(self, base, key, value):
+        with self._guard:
+            self._layouts.setdefault(base, {})[key] = value
+
+    def forget_layout(self, base, key):
+        with self._guard:
+            self._layouts.get(base, {}).pop(key, None)
+
+    def request(self, base, username, password, method, path, timeout=10, **kwargs):
+        """
+        Authenticated request with transparent re-login.
+        Returns (response, None) or (None, error message).
+        With stream=True the body is left unread; only a 403 counts as an
+        expired session then.
+        """
+        # per-request verify=False: REQUESTS_CA_BUNDLE would override session.verify
+        kwargs.setdefault("verify", False)
+        # only the session lookup / re-login is locked; the round trip itself is
+        # not, so a slow syslog GET does not hold up actions on the same miner
+        # (callers lock around their own GET token -> POST sequences)
+        entry, err = self.session(base, username, password)
+        if not entry:
+            return None, err
+        resp = entry.http.request(method, entry.url(path), timeout=timeout, **kwargs)
+        if is_login_page(resp, read_body=not kwargs.get("stream")):
+            entry, err = self._relogin(base, username, password, entry)
+            if not entry:
+                return None, err
+            resp = entry.http.request(method, entry.url(path), timeout=timeout, **kwargs)
+        entry.last_used = time.time()
+        return resp, None
+
+    def _relogin(self, base, username, password, stale):
+        """Fresh login after `stale` was rejected, unless another thread already did it"""
+        with self.lock(base):
+            current = self._entries.get((base, username))
+            if current is not None and current is not stale:
+                return current, None
+            print(f"🔄 LuCI session expired for {base}, logging in again")
+            return self.session(base, username, password, fresh=True)
+
+
+# global instance shared by all modules
+luci_sessions = LuciSessionPool()
@@ -2,22 +2,31 @@
 # -*- coding: utf-8 -*-
 
 import os
-import socket
+import asyncio
+import gzip
+import hashlib
 import json
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
 from datetime import datetime, timedelta
 import pytz
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, request, jsonify
 import jdatetime
 
 # ایمپورت از فایل‌های جدید
 from login_save import update_login_data, get_week_report
-from pools_manager import update_miner_pools, get_pools_manager_html
-from reboot import reboot_miner, get_reboot_manager_html
+from pools_manager import update_miner_pools, bulk_update_miner_pools, get_pools_manager_html
+from reboot import reboot_miner, RebootScheduler, get_reboot_manager_html
 from terminal import execute_terminal_command, get_terminal_html
-from NTP import update_ntp_settings, get_ntp_html
+from NTP import update_ntp_settings, bulk_super_ntp_update, get_ntp_html
 # در پایین فایل logs_viewer.py
 from logs_viewer import logs_viewer
+from poller import MinerPoller, ChangeFeed
+from metrics_store import MetricsStore
+from log_archive import LogArchive, LogCollector, SEVERITIES
+from log_anomalies import AnomalyCounter, ANOMALIES, ANOMALY_LABELS
+from assets import AssetRegistry, IMMUTABLE_CACHE
+import miner_api
 
 app = Flask(__name__)
 
@@ -39,8 +48,17 @@ port_map = {
 }
 
 SOCKET_TIMEOUT = 3.0
-MAX_WORKERS = 6
-COMMANDS = [{"command": "summary"}, {"command": "devs"}]
+# سقف اتصال هم‌زمان به ماینرها در هر دور پولینگ
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", miner_api.MAX_CONCURRENCY))
+# دستورهایی که در هر دور از هر ماینر گرفته می‌شوند (مثلاً summary,devs,pools,stats,edevs)
+COMMANDS = [c.strip() for c in os.environ.get("MINER_COMMANDS", "summary,devs").split(",") if c.strip()]
+# آستانه‌های رنگ‌بندی داشبورد (در پایتون محاسبه می‌شوند، نه در قالب)
+TEMP_HIGH = 60
+HASHRATE_LOW = 60
+UPTIME_NEW_SECONDS = 86400
+
+# فاصله‌ی بین هر دور پولینگ پس‌زمینه (ثانیه)
+POLL_INTERVAL = float(os.environ.get("POLL_INTERVAL", 10))
 
 def build_miners():
     ip = MINER_IP
@@ -49,42 +67,6 @@ def build_miners():
         miners.append({"name": name, "ip": ip, "port": port})
     return miners
 
-# === TCP JSON sender ===
-def send_tcp_json(ip, port, payload):
-    if not ip:
-        return None
-    data = json.dumps(payload).encode("utf-8")
-    try:
-        with socket.create_connection((ip, port), timeout=SOCKET_TIMEOUT) as s:
-            s.settimeout(SOCKET_TIMEOUT)
-            s.sendall(data)
-            chunks = []
-            while True:
-                try:
-                    chunk = s.recv(4096)
-                    if not chunk:
-                        break
-                    chunks.append(chunk)
-                except socket.timeout:
-                    break
-            raw = b"".join(chunks).decode("utf-8", errors="ignore").strip()
-            if not raw:
-                return None
-            try:
-                return json.loads(raw)
-            except Exception:
-                first = raw.find("{")
-                last = raw.rfind("}")
-                if first != -1 and last != -1 and last > first:
-                    sub = raw[first:last+1]
-                    try:
-                        return json.loads(sub)
-                    except Exception:
-                        return None
-            return None
-    except Exception:
-        return None
-
 # === Helpers ===
 def format_seconds_pretty(sec: int):
     days, rem = divmod(sec, 86400)
@@ -126,6 +108,7 @@ def parse_summary(summary_json):
     uptime_str = format_seconds_pretty(int(uptime)) if uptime else None
     return {
         "uptime": uptime_str,
+        "uptime_seconds": int(uptime) if uptime else None,
         "hashrate": hashrate,
         "power": int(power) if power else None,
         "temp_avg": round(temp, 1) if temp else None,
@@ -133,35 +116,64 @@ def parse_summary(summary_json):
 
 def parse_devs(devs_json):
     board_temps = []
-    if not devs_json or "DEVS" not in devs_json:
+    if not devs_json:
+        return board_temps
+    boards = devs_json.get("DEVS") or devs_json.get("EDEVS")
+    if not boards:
         return board_temps
-    for board in devs_json["DEVS"]:
+    for board in boards:
         temp = board.get("Temperature")
         if temp is not None:
             board_temps.append(round(temp, 1))
     return board_temps
 
-def poll_miner(miner):
+def classify_temp(temp):
+    return "low" if temp < TEMP_HIGH else "high"
+
+def classify_hashrate(hashrate):
+    if not hashrate:
+        return None
+    return "low" if hashrate < HASHRATE_LOW else "normal"
+
+def classify_uptime(uptime_seconds):
+    if uptime_seconds is None:
+        return None
+    return "new" if uptime_seconds < UPTIME_NEW_SECONDS else "old"
+
+def parse_pools(pools_json):
+    pools = []
+    if not pools_json or "POOLS" not in pools_json:
+        return pools
+    for pool in pools_json["POOLS"]:
+        pools.append({
+            "url": pool.get("URL"),
+            "user": pool.get("User"),
+            "status": pool.get("Status"),
+        })
+    return pools
+
+async def poll_miner(miner):
     ip = miner["ip"]
     port = miner["port"]
     result = {
         "name": f"{miner['name']} ({port})",
+        "miner": miner["name"],
         "alive": False,
         "hashrate": None,
         "uptime": None,
+        "uptime_seconds": None,
         "power": None,
+        "temp_avg": None,
         "board_temps": [],
+        "board_temp_levels": [],
+        "hashrate_class": None,
+        "uptime_class": None,
     }
     if not ip:
         return result
-    responses = {}
-    any_response = False
-    for cmd in COMMANDS:
-        resp = send_tcp_json(ip, port, cmd)
-        if resp:
-            any_response = True
-            responses[cmd["command"]] = resp
-    if not any_response:
+    # یک رفت‌وبرگشت برای همه‌ی دستورها (summary+devs)، با fallback تک‌دستوری
+    responses = await miner_api.request_many(ip, port, COMMANDS, SOCKET_TIMEOUT)
+    if not responses:
         return result
     result["alive"] = True
     if "summary" in responses:
@@ -170,12 +182,22 @@ def poll_miner(miner):
             {
                 "hashrate": summary.get("hashrate"),
                 "uptime": summary.get("uptime"),
+                "uptime_seconds": summary.get("uptime_seconds"),
                 "power": summary.get("power"),
+                "temp_avg": summary.get("temp_avg"),
             }
         )
-    if "devs" in responses:
-        boards = parse_devs(responses["devs"])
+    devs = responses.get("devs") or responses.get("edevs")
+    if devs:
+        boards = parse_devs(devs)
         result["board_temps"] = boards
+        result["board_temp_levels"] = [classify_temp(t) for t in boards]
+    if "pools" in responses:
+        result["pools"] = parse_pools(responses["pools"])
+    result["hashrate_class"] = classify_hashrate(result["hashrate"])
+    result["uptime_class"] = classify_uptime(result["uptime_seconds"])
+    # پاسخ خام برای /api/miners?raw=1 (در خروجی‌های دیگر حذف می‌شود)
+    result["raw"] = responses
     return result
 
 def get_live_data():
@@ -183,16 +205,20 @@ def get_live_data():
     out = []
     if not miners:
         return []
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
-        futures = {ex.submit(poll_miner, m): m for m in miners}
-        for fut in futures:
-            try:
-                res = fut.result()
-            except Exception:
-                res = {"name": f"{futures[fut]['name']} ({futures[fut]['port']})", "alive": False}
-            out.append(res)
+    # همه‌ی ماینرها در یک event loop و به‌صورت هم‌زمان
+    results = asyncio.run(miner_api.gather_limited(poll_miner, miners, MAX_CONCURRENCY))
+    for m, res in zip(miners, results):
+        if isinstance(res, BaseException):
+            res = {"name": f"{m['name']} ({m['port']})", "alive": False}
+        out.append(res)
     return sorted(out, key=lambda x: x["name"])
 
+def public_miner(miner, raw=False):
+    """poll_miner dict without the raw API responses (unless asked for)"""
+    if raw:
+        return miner
+    return {k: v for k, v in miner.items() if k != "raw"}
+
 def calculate_total_hashrate(miners):
     total = 0
     for miner in miners:
@@ -200,6 +226,42 @@ def calculate_total_hashrate(miners):
             total += miner["hashrate"]
     return round(total, 2)
 
+# پولر پس‌زمینه - صفحه فقط آخرین snapshot را می‌خواند
+poller = MinerPoller(get_live_data, calculate_total_hashrate, interval=POLL_INTERVAL)
+# ذخیره‌ی هر دور پولینگ در دیتابیس سری زمانی
+metrics_store = MetricsStore()
+poller.subscribe(metrics_store.record_snapshot)
+# تغییرات هر دور برای /stream
+change_feed = ChangeFeed()
+poller.subscribe(change_feed.publish)
+
+# آرشیو دائمی لاگ‌ها: هر خط جدید (از مودال یا جمع‌آوری پس‌زمینه) ذخیره می‌شود
+log_archive = LogArchive()
+logs_viewer.subscribe(log_archive.on_new_lines)
+# شمارنده‌ی خطاهای سخت‌افزاری/استخر از خطوط تازه‌ی آرشیو -> دیتابیس سری زمانی
+anomaly_counter = AnomalyCounter(metrics_store)
+log_archive.subscribe(anomaly_counter.on_archived)
+log_collector = LogCollector(
+    lambda name: logs_viewer.refresh_miner(name, MINER_IP, port_map, MINER_USERNAME, MINER_PASSWORD),
+    list(port_map)
+)
+
+async def miner_online(miner_name):
+    """True when the miner answers the TCP summary API"""
+    if miner_name not in MINER_NAMES or not MINER_IP:
+        return False
+    port = MINER_PORTS[MINER_NAMES.index(miner_name)]
+    return await miner_api.request(MINER_IP, port, {"command": "summary"}, SOCKET_TIMEOUT) is not None
+
+def start_background():
+    """Start the poller and the log collector once (app startup; routes call it as a fallback)"""
+    poller.ensure_started()
+    if MINER_IP:
+        log_collector.ensure_started()
+
+# ریبوت موجی سمت سرور
+reboot_scheduler = RebootScheduler(miner_online)
+
 # === FULL TEMPLATE (HTML/CSS/JS) ===
 TEMPLATE = """
 <!doctype html>
@@ -257,6 +319,11 @@ tr:nth-child(even){background:#f8fafc;}
 .uptime-new{color:#1d4ed8; font-weight:bold;}   /* آپ‌تایم زیر 1 روز آبی */
 .uptime-old{color:#16a34a; font-weight:bold;}   /* آپ‌تایم >= 1 روز سبز */
 @media(max-width:600px){th,td{font-size:16px;padding:8px;}}
+/* sparkline */
+.sparkline polyline{fill:none;stroke:#2563eb;stroke-width:1.5;}
+/* log anomaly counters */
+.anomaly{display:inline-block; margin:1px 2px; padding:1px 6px; border-radius:10px; background:#fee2e2; color:#b91c1c; font-size:12px; font-weight:bold; white-space:nowrap;}
+.anomaly-none{color:#16a34a;}
 /* terminal pre */
 .terminal-pre { background:#0b1220; color:#00ff88; padding:10px; height:300px; overflow:auto; border-radius:8px; font-family:monospace; font-size:13px; white-space:pre-wrap; }
 </style>
@@ -282,7 +349,7 @@ tr:nth-child(even){background:#f8fafc;}
             <button class="icon-btn" onclick="showLogsModal()" title="View Logs">📋</button>
         </div>
         <div class="total-hashrate">
-            Total Hashrate: {{ total_hashrate }} TH/s
+            Total Hashrate: <span id="totalHashrate">{{ total_hashrate }}</span> TH/s
         </div>
     </div>
     <button class="report-btn" onclick="showLoginReport()">📊</button>
@@ -295,13 +362,15 @@ tr:nth-child(even){background:#f8fafc;}
 <th>Uptime</th>
 <th>Board Temp (°C)</th>
 <th>Hashrate</th>
+<th>Log Alerts (24h)</th>
 <th>Power (W)</th>
+<th>24h</th>
 </tr>
 </thead>
 <tbody>
 {% for m in miners %}
-<tr>
-<td>
+<tr data-miner="{{ m.miner }}">
+<td class="cell-name">
 <!-- لینک اصلاح شده: با استفاده از port_map سراسری و fallback به m.port -->
 <a href="https://{{ MINER_IP }}:{{ port_map.get(m.name.split(' ')[0], m.port) }}" target="_blank">{{ m.name }}</a>
 
@@ -315,49 +384,18 @@ tr:nth-child(even){background:#f8fafc;}
 <!-- Uptime -->
 <td>
 {% if m.uptime %}
-    {% set uptime_sec = 0 %}
-    {% if 'd' in m.uptime %}
-        {% set parts = m.uptime.split('d') %}
-        {% set uptime_sec = (parts[0] | int) * 86400 %}
-        {% if 'h' in parts[1] %}
-            {% set h_parts = parts[1].split('h') %}
-            {% set uptime_sec = uptime_sec + (h_parts[0]|int)*3600 %}
-            {% if 'm' in h_parts[1] %}
-                {% set m_parts = h_parts[1].split('m') %}
-                {% set uptime_sec = uptime_sec + (m_parts[0]|int)*60 %}
-            {% endif %}
-        {% endif %}
-    {% elif 'h' in m.uptime %}
-        {% set h_parts = m.uptime.split('h') %}
-        {% set uptime_sec = (h_parts[0]|int)*3600 %}
-        {% if 'm' in h_parts[1] %}
-            {% set m_parts = h_parts[1].split('m') %}
-            {% set uptime_sec = uptime_sec + (m_parts[0]|int)*60 %}
-        {% endif %}
-    {% elif 'm' in m.uptime %}
-        {% set uptime_sec = (m.uptime.split('m')[0]|int)*60 %}
-    {% endif %}
-    
-    {% if uptime_sec < 86400 %}
-        <span class="uptime-new">{{ m.uptime }}</span>
-    {% else %}
-        <span class="uptime-old">{{ m.uptime }}</span>
-    {% endif %}
+    <span class="uptime-{{ m.uptime_class }}">{{ m.uptime }}</span>
 {% else %}
     -
 {% endif %}
 </td>
 
 <!-- Temperature -->
-<td>
+<td class="cell-temps">
 {% if m.board_temps %}
 <div class="temp-container">
   {% for temp in m.board_temps %}
-    {% if temp < 60 %}
-      <span class="temp-low">{{ temp }}</span>
-    {% else %}
-      <span class="temp-high">{{ temp }}</span>
-    {% endif %}
+    <span class="temp-{{ m.board_temp_levels[loop.index0] }}">{{ temp }}</span>
   {% endfor %}
 </div>
 {% else %}
@@ -366,19 +404,18 @@ tr:nth-child(even){background:#f8fafc;}
 </td>
 
 <!-- Hashrate -->
-<td>
+<td class="cell-hashrate">
 {% if m.hashrate %}
-  {% if m.hashrate < 60 %}
-    <span class="hash-low">{{ m.hashrate }}</span>
-  {% else %}
-    <span class="hash-normal">{{ m.hashrate }}</span>
-  {% endif %}
+  <span class="hash-{{ m.hashrate_class }}">{{ m.hashrate }}</span>
 {% else %}
   -
 {% endif %}
 </td>
 
+<td class="cell-anomalies" data-miner="{{ m.miner }}">-</td>
+
 <td>{{ m.power or "-" }}</td>
+<td><svg class="sparkline" data-miner="{{ m.miner }}" width="120" height="28" viewBox="0 0 120 28"></svg></td>
 </tr>
 {% endfor %}
 </tbody>
@@ -590,6 +627,10 @@ function loadMinerLogs() {
         showStatus('⚠️ Please select a miner first!', 'warning');
         return;
     }
+    if (miner === '*' || miner.includes(',')) {
+        loadMergedLogs(miner, hours, output);
+        return;
+    }
 
     showProgressBar();
     showStatus(`🚀 Starting log retrieval for Miner ${miner}...`, 'info');
@@ -603,17 +644,58 @@ function loadMinerLogs() {
         </div>
     `;
 
-    // شبیه‌سازی پروگرس بار
-    let progress = 10;
-    const progressInterval = setInterval(() => {
-        progress += 2;
-        if (progress <= 90) {
-            updateProgressBar(progress, 'Connecting to miner...');
+    // the server streams one JSON event per line: start, progress, lines..., done/error
+    let result = null;
+    let percent = 10;
+    function handleLogEvent(ev) {
+        if (ev.type === 'start') {
+            renderLogLines(output, {miner: ev.miner, hours: ev.hours, classes: ev.classes, limit: ev.limit, lines: []});
+        } else if (ev.type === 'progress') {
+            const kb = Math.round(ev.received / 1024);
+            if (ev.total) {
+                percent = Math.min(99, Math.max(percent, Math.round(ev.received * 100 / ev.total)));
+                updateProgressBar(percent, `${ev.stage} ${kb} / ${Math.round(ev.total / 1024)} KB`);
+            } else {
+                updateProgressBar(percent, ev.received ? `${ev.stage} ${kb} KB` : ev.stage);
+            }
+        } else if (ev.type === 'lines') {
+            appendLogLines(output, ev.lines);
+        } else if (ev.type === 'reset') {
+            resetLogLines(output);
+        } else {
+            result = ev;
         }
-    }, 100);
+    }
+
+    function finish() {
+        updateProgressBar(100, result && result.type === 'done' ? 'Completed!' : 'Error!');
+        setTimeout(hideProgressBar, 500);
+
+        if (result && result.type === 'done') {
+            showStatus(result.message, 'success');
+        } else if (result && result.type === 'error') {
+            showStatus(result.message || 'Unknown error', 'error');
+            output.innerHTML = `
+                <div style="text-align: center; color: #ef4444; padding: 30px 20px;">
+                    <div style="font-size: 32px; margin-bottom: 12px;">❌</div>
+                    <div style="font-size: 14px; font-weight: 500;">${result.message || 'Error'}</div>
+                    <div style="font-size: 12px; color: #fca5a5; margin-top: 8px;">${result.logs || 'No details'}</div>
+                </div>
+            `;
+        } else {
+            showStatus('❌ Invalid response format', 'error');
+            output.innerHTML = `
+                <div style="text-align: center; color: #ef4444; padding: 30px 20px;">
+                    <div style="font-size: 32px; margin-bottom: 12px;">🤔</div>
+                    <div style="font-size: 14px; font-weight: 500;">Invalid Response</div>
+                    <div style="font-size: 12px; color: #fca5a5; margin-top: 8px;">The log stream ended without a result</div>
+                </div>
+            `;
+        }
+    }
 
     // ارسال درخواست
-    fetch('/get_miner_logs', {
+    fetch('/get_miner_logs/stream', {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
         body: JSON.stringify({
@@ -625,44 +707,29 @@ function loadMinerLogs() {
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
-        return response.json();
-    })
-    .then(data => {
-        console.log('📦 Received data:', data);
-        clearInterval(progressInterval);
-        updateProgressBar(100, 'Completed!');
-        
-        setTimeout(() => {
-            hideProgressBar();
-            
-            if (data && data.status === 'success') {
-                showStatus(data.message, 'success');
-                output.innerHTML = data.logs || 'No logs content received';
-                output.scrollTop = output.scrollHeight;
-            } else if (data && data.status === 'error') {
-                showStatus(data.message || 'Unknown error', 'error');
-                output.innerHTML = `
-                    <div style="text-align: center; color: #ef4444; padding: 30px 20px;">
-                        <div style="font-size: 32px; margin-bottom: 12px;">❌</div>
-                        <div style="font-size: 14px; font-weight: 500;">${data.message || 'Error'}</div>
-                        <div style="font-size: 12px; color: #fca5a5; margin-top: 8px;">${data.logs || 'No details'}</div>
-                    </div>
-                `;
-            } else {
-                showStatus('❌ Invalid response format', 'error');
-                output.innerHTML = `
-                    <div style="text-align: center; color: #ef4444; padding: 30px 20px;">
-                        <div style="font-size: 32px; margin-bottom: 12px;">🤔</div>
-                        <div style="font-size: 14px; font-weight: 500;">Invalid Response</div>
-                        <div style="font-size: 12px; color: #fca5a5; margin-top: 8px;">Received: ${JSON.stringify(data)}</div>
-                    </div>
-                `;
-            }
-        }, 500);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        function pump() {
+            return reader.read().then(({done, value}) => {
+                if (value) {
+                    buffer += decoder.decode(value, {stream: true});
+                    const lines = buffer.split('\\n');
+                    buffer = lines.pop();
+                    lines.filter(l => l.trim()).forEach(l => handleLogEvent(JSON.parse(l)));
+                }
+                if (done) {
+                    if (buffer.trim()) handleLogEvent(JSON.parse(buffer));
+                    finish();
+                    return;
+                }
+                return pump();
+            });
+        }
+        return pump();
     })
     .catch(err => {
         console.error('🚨 Fetch error:', err);
-        clearInterval(progressInterval);
         updateProgressBar(100, 'Error!');
         hideProgressBar();
         showStatus('⚠️ Connection error occurred', 'error');
@@ -676,6 +743,56 @@ function loadMinerLogs() {
     });
 }
 
+// several miners fetched in parallel on the server and merged into one timeline
+function loadMergedLogs(group, hours, output) {
+    const miners = group === '*' ? [] : group.split(',');
+    const label = group === '*' ? 'all miners' : `miners ${group}`;
+
+    showProgressBar();
+    showStatus(`🚀 Fetching logs of ${label} in parallel...`, 'info');
+    updateProgressBar(50, 'Fetching and merging logs...');
+    output.innerHTML = `
+        <div style="text-align: center; color: #3b82f6; padding: 30px 20px;">
+            <div style="font-size: 32px; margin-bottom: 12px;">⏳</div>
+            <div style="font-size: 14px; font-weight: 500;">Loading merged logs of ${label}</div>
+        </div>
+    `;
+
+    fetch('/get_miner_logs/merged', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({miners: miners, hours: hours})
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(data => {
+        updateProgressBar(100, 'Completed!');
+        setTimeout(hideProgressBar, 500);
+        if (data && data.format === 'tokens' && data.status === 'success') {
+            showStatus(`${data.message} in ${data.took_ms} ms`, Object.keys(data.errors || {}).length ? 'warning' : 'success');
+            renderLogLines(output, data);
+        } else {
+            showStatus((data && data.message) || 'Unknown error', 'error');
+            output.innerHTML = `
+                <div style="text-align: center; color: #ef4444; padding: 30px 20px;">
+                    <div style="font-size: 32px; margin-bottom: 12px;">❌</div>
+                    <div style="font-size: 14px; font-weight: 500;">${(data && data.message) || 'Error'}</div>
+                    <div style="font-size: 12px; color: #fca5a5; margin-top: 8px;">${(data && data.logs) || 'No details'}</div>
+                </div>
+            `;
+        }
+    })
+    .catch(err => {
+        console.error('🚨 Fetch error:', err);
+        hideProgressBar();
+        showStatus('⚠️ Connection error occurred', 'error');
+    });
+}
+
 function clearLogs() {
     resetLogsOutput();
     hideProgressBar();
@@ -683,7 +800,7 @@ function clearLogs() {
 }
 
 function exportLogs() {
-    const logsContent = document.getElementById('logsOutput').innerText;
+    const logsContent = currentLogsText();
     if (!logsContent || logsContent.includes('Select a miner')) {
         showStatus('⚠️ No logs to export!', 'warning');
         return;
@@ -813,8 +930,96 @@ function sendCommand(){
     });
 }
 
+// Sparklines - downsampled server-side by /api/history
+function drawSparkline(svg, points) {
+    if (!points || points.length < 2) return;
+    const w = 120, h = 28, pad = 2;
+    const xs = points.map(p => p[0]), ys = points.map(p => p[1]);
+    const x0 = Math.min(...xs), x1 = Math.max(...xs);
+    const y0 = Math.min(...ys), y1 = Math.max(...ys);
+    const sx = x1 > x0 ? (w - 2 * pad) / (x1 - x0) : 0;
+    const sy = y1 > y0 ? (h - 2 * pad) / (y1 - y0) : 0;
+    const coords = points.map(p =>
+        (pad + (p[0] - x0) * sx).toFixed(1) + ',' + (h - pad - (p[1] - y0) * sy).toFixed(1)
+    ).join(' ');
+    svg.innerHTML = '<polyline points="' + coords + '"></polyline>';
+}
+
+function loadSparklines() {
+    document.querySelectorAll('svg.sparkline').forEach(svg => {
+        const miner = svg.dataset.miner;
+        if (!miner) return;
+        fetch('/api/history?miner=' + encodeURIComponent(miner) + '&metric=hashrate&points=60')
+            .then(r => r.json())
+            .then(data => drawSparkline(svg, data.points))
+            .catch(err => console.error('Sparkline error:', err));
+    });
+}
+
+// Log anomaly counters - counted from archived syslog lines by the server
+const ANOMALY_ICONS = {chain_error: '⛓', fan_fault: '🌀', temp_protect: '🌡', pool_disconnect: '🔌', restart: '🔄'};
+
+function loadAnomalies() {
+    fetch('/api/log_anomalies?hours=24')
+        .then(r => r.json())
+        .then(data => {
+            document.querySelectorAll('td.cell-anomalies').forEach(cell => {
+                const counts = data.miners[cell.dataset.miner] || {};
+                const badges = data.anomalies.filter(a => counts[a]).map(a =>
+                    '<span class="anomaly" title="' + data.labels[a] + '">' + ANOMALY_ICONS[a] + ' ' + counts[a] + '</span>');
+                cell.innerHTML = badges.length ? badges.join('') : '<span class="anomaly-none">0</span>';
+            });
+        })
+        .catch(err => console.error('Anomalies error:', err));
+}
+
+// Live updates - /stream sends only changed fields per miner
+function patchMinerRow(name, delta) {
+    const row = document.querySelector('tr[data-miner="' + name + '"]');
+    if (!row) return;
+    if ('alive' in delta) {
+        const status = row.querySelector('.cell-name .status-online, .cell-name .status-offline');
+        if (status) {
+            status.className = delta.alive ? 'status-online' : 'status-offline';
+            status.textContent = delta.alive ? 'Online' : 'Offline';
+        }
+    }
+    if ('hashrate' in delta) {
+        const cell = row.querySelector('.cell-hashrate');
+        const h = delta.hashrate;
+        cell.innerHTML = h ? '<span class="hash-' + delta.hashrate_class + '">' + h + '</span>' : '-';
+    }
+    if ('board_temps' in delta) {
+        const cell = row.querySelector('.cell-temps');
+        const temps = delta.board_temps || [];
+        const levels = delta.board_temp_levels || [];
+        cell.innerHTML = temps.length
+            ? '<div class="temp-container">' + temps.map((t, i) =>
+                '<span class="temp-' + levels[i] + '">' + t + '</span>').join('') + '</div>'
+            : '-';
+    }
+}
+
+function startLiveStream() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/stream');
+    source.onmessage = function(e) {
+        const event = JSON.parse(e.data);
+        if (event.miners) {
+            Object.keys(event.miners).forEach(name => patchMinerRow(name, event.miners[name]));
+        }
+        if ('total_hashrate' in event) {
+            document.getElementById('totalHashrate').textContent = event.total_hashrate;
+        }
+    };
+}
+
 // بستن با کلیک خارج از مودال‌ها
 document.addEventListener('DOMContentLoaded', function() {
+    loadSparklines();
+    loadAnomalies();
+    setInterval(loadAnomalies, 60000);
+    startLiveStream();
     const poolsOverlay = document.getElementById('poolsModalOverlay');
     const rebootOverlay = document.getElementById('rebootModalOverlay');
     const terminalOverlay = document.getElementById('terminalOverlay');
@@ -842,22 +1047,225 @@ document.addEventListener('DOMContentLoaded', function() {
 </html>
 
 """
+
+# قالب فقط یک بار کامپایل می‌شود؛ CSS/JS ثابت به فایل‌های hash‌دار قابل کش منتقل می‌شوند
+assets = AssetRegistry()
+DASHBOARD_TEMPLATE = app.jinja_env.from_string(assets.externalize(TEMPLATE))
+
 # === ROUTES ===
 @app.route("/", methods=["GET", "POST"])
 def index():
     # ثبت لاگین فقط در صورت رفرش/باز شدن صفحه
     update_login_data()
-    miners = get_live_data()
-    total_hashrate = calculate_total_hashrate(miners)
-    return render_template_string(
-        TEMPLATE,
-        miners=miners,
-        total_hashrate=total_hashrate,
+    start_background()
+    snap = poller.snapshot()
+    return DASHBOARD_TEMPLATE.render(
+        miners=snap.miners,
+        total_hashrate=snap.total_hashrate,
         MINER_IP=MINER_IP or "127.0.0.1",
         port_map=port_map,
         MINER_NAMES=MINER_NAMES
     )
 
+@app.route("/assets/<filename>")
+def static_asset(filename):
+    """Content-hashed CSS/JS split out of TEMPLATE"""
+    asset = assets.get(filename)
+    if asset is None:
+        return Response("Not found", status=404)
+    body, gz_body, mimetype = asset
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        resp = Response(gz_body, mimetype=mimetype)
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(body, mimetype=mimetype)
+    resp.headers["Cache-Control"] = IMMUTABLE_CACHE
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+@app.route("/api/snapshot")
+def api_snapshot():
+    """Latest miner snapshot from the background poller (no miner traffic)"""
+    poller.ensure_started()
+    snap = poller.snapshot()
+    return jsonify({
+        "miners": [public_miner(m) for m in snap.miners],
+        "total_hashrate": snap.total_hashrate,
+        "updated_at": snap.updated_at,
+        "cycle": snap.cycle,
+        "interval": poller.interval
+    })
+
+# بدنه‌ی JSON و نسخه‌ی gzip هر پاسخ API فقط یک بار در هر دور پولینگ ساخته می‌شود
+_api_cache = {"cycle": None, "entries": {}}
+_api_cache_lock = threading.Lock()
+
+def _cached_api_response(key, build):
+    snap = poller.snapshot()
+    with _api_cache_lock:
+        # only ever move forward - a request still holding an older snapshot must not reset the cache
+        if _api_cache["cycle"] is None or snap.cycle > _api_cache["cycle"]:
+            _api_cache["cycle"] = snap.cycle
+            _api_cache["entries"] = {}
+        entry = _api_cache["entries"].get(key) if _api_cache["cycle"] == snap.cycle else None
+    if entry is None:
+        payload = build(snap)
+        if payload is None:
+            return None
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()
+        entry = (etag, body, gzip.compress(body, 6))
+        with _api_cache_lock:
+            if _api_cache["cycle"] == snap.cycle:
+                entry = _api_cache["entries"].setdefault(key, entry)
+    etag, body, gz_body = entry
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        resp = Response(gz_body, mimetype="application/json")
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = f"max-age={int(poller.interval)}"
+    return resp
+
+def _wants_raw():
+    return request.args.get("raw", "").lower() in ("1", "true", "yes")
+
+@app.route("/api/miners")
+def api_miners():
+    """All miners from the latest snapshot; ?raw=1 adds the raw summary/devs responses"""
+    poller.ensure_started()
+    raw = _wants_raw()
+    return _cached_api_response(("all", raw), lambda snap: {
+        "miners": [public_miner(m, raw) for m in snap.miners],
+        "total_hashrate": snap.total_hashrate,
+        "updated_at": snap.updated_at,
+        "cycle": snap.cycle
+    })
+
+@app.route("/api/miners/<name>")
+def api_miner(name):
+    """One miner (by name, e.g. 131) from the latest snapshot"""
+    poller.ensure_started()
+    raw = _wants_raw()
+
+    def build(snap):
+        for m in snap.miners:
+            if m.get("miner") == name:
+                return {"miner": public_miner(m, raw), "updated_at": snap.updated_at, "cycle": snap.cycle}
+        return None
+
+    resp = _cached_api_response((name, raw), build)
+    if resp is None:
+        return jsonify({"error": f"Miner {name} not found"}), 404
+    return resp
+
+@app.route("/stream")
+def stream():
+    """Server-Sent Events: miner state diffs pushed after every poll cycle"""
+    poller.ensure_started()
+    listener = change_feed.listen()
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = listener.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    # dropped by the feed - closing makes EventSource reconnect
+                    return
+                yield f"data: {json.dumps(event, separators=(',', ':'))}\n\n"
+        finally:
+            change_feed.unlisten(listener)
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/history")
+def api_history():
+    """/api/history?miner=131&metric=hashrate&from=&to=&points=&mode=lttb|minmax"""
+    miner_name = request.args.get("miner")
+    metric = request.args.get("metric", "hashrate")
+    if not miner_name:
+        return jsonify({"error": "Missing miner"}), 400
+    try:
+        end = float(request.args.get("to") or datetime.now().timestamp())
+        start = float(request.args.get("from") or end - 86400)
+        points = min(max(int(request.args.get("points", 300)), 3), 5000)
+    except ValueError:
+        return jsonify({"error": "Invalid from/to/points"}), 400
+    mode = request.args.get("mode", "lttb")
+    table, series = metrics_store.history(miner_name, metric, start, end, points, mode)
+    return jsonify({
+        "miner": miner_name,
+        "metric": metric,
+        "from": start,
+        "to": end,
+        "resolution": table,
+        "points": [[ts, round(value, 3)] for ts, value in series]
+    })
+
+@app.route("/api/logs/search")
+def api_logs_search():
+    """/api/logs/search?q=chain&severity=err&miner=&days=7|from=&to=&limit="""
+    severity = request.args.get("severity") or None
+    if severity and severity not in SEVERITIES:
+        return jsonify({"error": f"severity must be one of {', '.join(SEVERITIES)}"}), 400
+    try:
+        end = float(request.args.get("to") or datetime.now().timestamp())
+        if request.args.get("from"):
+            start = float(request.args["from"])
+        else:
+            start = end - float(request.args.get("days", 7)) * 86400
+        limit = int(request.args.get("limit", 200))
+    except ValueError:
+        return jsonify({"error": "Invalid from/to/days/limit"}), 400
+    started = datetime.now()
+    results = log_archive.search(
+        request.args.get("q", ""),
+        miner=request.args.get("miner") or None,
+        severity=severity,
+        start=start,
+        end=end,
+        limit=limit
+    )
+    return jsonify({
+        "from": start,
+        "to": end,
+        "count": len(results),
+        "took_ms": round((datetime.now() - started).total_seconds() * 1000, 2),
+        "collector": {"last_run": log_collector.last_run, "errors": log_collector.errors},
+        "results": results
+    })
+
+@app.route("/api/log_anomalies")
+def api_log_anomalies():
+    """/api/log_anomalies?hours=24 - anomaly counts per miner from the syslog archive"""
+    try:
+        hours = min(max(float(request.args.get("hours", 24)), 0), 24 * 14)
+    except ValueError:
+        return jsonify({"error": "Invalid hours"}), 400
+    return jsonify({
+        "hours": hours,
+        "anomalies": ANOMALIES,
+        "labels": ANOMALY_LABELS,
+        "miners": anomaly_counter.totals(list(port_map), hours),
+        "collector": {"last_run": log_collector.last_run, "errors": log_collector.errors}
+    })
+
+@app.route("/api/miner_api_stats")
+def api_miner_api_stats():
+    """Bytes / wall time per miner API call"""
+    return jsonify(miner_api.stats.summary())
+
 @app.route("/terminal_command", methods=["POST"])
 def terminal_command():
     """Route برای ترمینال"""
@@ -904,6 +1312,24 @@ def update_pools():
     except Exception as e:
         return jsonify({"error": str(e)})
 
+@app.route("/update_pools_bulk", methods=["POST"])
+def update_pools_bulk():
+    """Update pools on many miners in parallel; streams one JSON line per finished miner"""
+    data = request.get_json() or {}
+    miners = [m for m in (data.get("miners") or []) if m in port_map]
+    pools_data = data.get("pools")
+    worker_template = data.get("worker_template")
+
+    if not miners or not pools_data:
+        return jsonify({"error": "Missing miners or pools data"}), 400
+
+    def progress():
+        for item in bulk_update_miner_pools(miners, pools_data, MINER_USERNAME, MINER_PASSWORD, worker_template):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return Response(progress(), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route("/reboot_miner", methods=["POST"])
 def reboot_miner_route():
     """Reboot a miner"""
@@ -920,6 +1346,45 @@ def reboot_miner_route():
     except Exception as e:
         return jsonify({"error": str(e)})
 
+@app.route("/reboot_jobs", methods=["POST"])
+def create_reboot_job():
+    """Start a rolling-wave reboot job: {miners, wave_size, max_concurrency}"""
+    try:
+        data = request.get_json() or {}
+        miners = [m for m in (data.get("miners") or []) if m in port_map]
+        if not miners:
+            return jsonify({"error": "Missing miners"})
+        job = reboot_scheduler.submit(
+            miners,
+            wave_size=data.get("wave_size") or 3,
+            max_concurrency=data.get("max_concurrency") or 3,
+            username=MINER_USERNAME,
+            password=MINER_PASSWORD
+        )
+        return jsonify(job.to_dict())
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+@app.route("/reboot_jobs/<job_id>")
+def reboot_job_status(job_id):
+    job = reboot_scheduler.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/reboot_jobs/<job_id>/<action>", methods=["POST"])
+def reboot_job_action(job_id, action):
+    """resume / cancel a reboot job"""
+    if action == "resume":
+        job = reboot_scheduler.resume(job_id)
+    elif action == "cancel":
+        job = reboot_scheduler.cancel(job_id)
+    else:
+        return jsonify({"error": f"Unknown action {action}"}), 400
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
 # اضافه شدن route برای NTP
 @app.route("/update_ntp", methods=["POST"])
 def update_ntp():
@@ -940,6 +1405,42 @@ def update_ntp():
     except Exception as e:
         return jsonify({"error": str(e)})
 
+@app.route("/update_ntp_bulk", methods=["POST"])
+def update_ntp_bulk():
+    """
+    Apply NTP/timezone settings to many miners in one request (concurrently).
+    JSON: {miners, timezone, ntp_enabled, ntp_servers, max_workers}
+    """
+    try:
+        data = request.get_json() or {}
+        miners = [m for m in (data.get("miners") or []) if m in port_map]
+        if not miners:
+            return jsonify({"error": "Missing miners"}), 400
+
+        kwargs = {}
+        if data.get("max_workers"):
+            kwargs["max_workers"] = max(1, int(data["max_workers"]))
+
+        started = datetime.now()
+        results = bulk_super_ntp_update(
+            miners,
+            enable_ntp=data.get("ntp_enabled", True),
+            custom_servers=data.get("ntp_servers"),
+            timezone=data.get("timezone") or "Asia/Tehran",
+            username=MINER_USERNAME,
+            password=MINER_PASSWORD,
+            **kwargs
+        )
+        return jsonify({
+            "results": results,
+            "total": len(results),
+            "success_count": sum(1 for r in results if r["success"]),
+            "elapsed": round((datetime.now() - started).total_seconds(), 2)
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
 # اضافه شدن route جدید برای Logs
 @app.route("/get_miner_logs", methods=["POST"])
 def get_miner_logs_route():
@@ -958,7 +1459,9 @@ def get_miner_logs_route():
             miner_ip=MINER_IP,
             port_map=port_map,
             miner_username=MINER_USERNAME,
-            miner_password=MINER_PASSWORD
+            miner_password=MINER_PASSWORD,
+            fmt=data.get("format", "html"),
+            limit=data.get("limit")
         )
         
         return jsonify(result)
@@ -966,6 +1469,56 @@ def get_miner_logs_route():
     except Exception as e:
         return jsonify({"status": "error", "message": f"Server error: {str(e)}", "logs": ""})
 
+@app.route("/get_miner_logs/merged", methods=["POST"])
+def merged_miner_logs_route():
+    """Logs of several miners (all when none are given) merged into one timeline"""
+    try:
+        data = request.get_json() or {}
+        miners = data.get("miners") or list(port_map)
+        if isinstance(miners, str):
+            miners = list(port_map) if miners == "*" else miners.split(",")
+
+        result = logs_viewer.get_merged_logs(
+            miners=[str(m).strip() for m in miners],
+            hours=data.get("hours", 2),
+            miner_ip=MINER_IP,
+            port_map=port_map,
+            miner_username=MINER_USERNAME,
+            miner_password=MINER_PASSWORD,
+            limit=data.get("limit")
+        )
+        return jsonify(result)
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Server error: {str(e)}", "logs": ""})
+
+@app.route("/get_miner_logs/stream", methods=["POST"])
+def stream_miner_logs_route():
+    """get_miner_logs as NDJSON events - lines are sent while the syslog downloads"""
+    data = request.get_json() or {}
+    miner_name = data.get("miner")
+    if not miner_name:
+        return jsonify({"status": "error", "message": "Missing miner name", "logs": ""})
+
+    events = logs_viewer.stream_miner_logs(
+        miner_name=miner_name,
+        hours=data.get("hours", 2),
+        miner_ip=MINER_IP,
+        port_map=port_map,
+        miner_username=MINER_USERNAME,
+        miner_password=MINER_PASSWORD,
+        limit=data.get("limit")
+    )
+
+    def progress():
+        for event in events:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return Response(progress(), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
+    # polling, metrics and the log archive run from startup, not from the first page view
+    start_background()
     port = int(os.environ.get("PORT", 8000))
     app.run(host="0.0.0.0", port=port, debug=False)
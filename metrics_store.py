@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+metrics_store.py - Local time-series store for poll results.
+
+Raw samples go to one SQLite table (WAL mode); every insert also updates
+1 min / 1 h / 1 day rollup rows in the same transaction, so long-range
+queries read pre-aggregated buckets and never scan raw samples.
+"""
+
+import os
+import time
+
+from shared import SQLiteStore
+
+METRICS_DB = os.environ.get("METRICS_DB", "metrics.db")
+
+# table -> (bucket seconds, retention seconds or None = keep forever)
+RESOLUTIONS = [
+    ("samples", 0, 2 * 86400),
+    ("rollup_1m", 60, 14 * 86400),
+    ("rollup_1h", 3600, 400 * 86400),
+    ("rollup_1d", 86400, None),
+]
+ROLLUPS = [r for r in RESOLUTIONS if r[1]]
+
+PRUNE_EVERY = 3600
+# بیشترین تعداد نقطه‌ای که یک کوئری از جدول انتخابی برمی‌گرداند
+MAX_QUERY_POINTS = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    miner TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (miner, metric, ts)
+) WITHOUT ROWID;
+"""
+
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    miner TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (miner, metric, ts)
+) WITHOUT ROWID;
+"""
+
+_ROLLUP_UPSERT = """
+INSERT INTO {table} (miner, metric, ts, count, sum, min, max)
+VALUES (?, ?, ?, 1, ?, ?, ?)
+ON CONFLICT (miner, metric, ts) DO UPDATE SET
+    count = count + 1,
+    sum = sum + excluded.sum,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max)
+"""
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    points: [(ts, value), ...] sorted by ts -> at most `threshold` points.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    out = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third triangle vertex
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        nxt = points[nxt_start:nxt_end] or [points[-1]]
+        avg_x = sum(p[0] for p in nxt) / len(nxt)
+        avg_y = sum(p[1] for p in nxt) / len(nxt)
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(points[best])
+        a = best
+    out.append(points[-1])
+    return out
+
+
+def minmax_buckets(rows, threshold):
+    """
+    rows: [(ts, avg, min, max), ...] -> at most `threshold` points, keeping
+    the min and the max of every bucket (in time order) so spikes survive.
+    """
+    n = len(rows)
+    if n <= threshold:
+        return [(r[0], r[1]) for r in rows]
+    buckets = max(1, threshold // 2)
+    size = n / buckets
+    out = []
+    for b in range(buckets):
+        chunk = rows[int(b * size):int((b + 1) * size)]
+        if not chunk:
+            continue
+        lo = min(chunk, key=lambda r: r[2])
+        hi = max(chunk, key=lambda r: r[3])
+        pair = [(lo[0], lo[2]), (hi[0], hi[3])]
+        pair.sort()
+        out.extend(pair)
+    return out
+
+
+def miner_samples(miner):
+    """poll_miner dict -> [(metric, value), ...]"""
+    out = [("alive", 1.0 if miner.get("alive") else 0.0)]
+    if not miner.get("alive"):
+        return out
+    for metric in ("hashrate", "power", "uptime_seconds", "temp_avg"):
+        value = miner.get(metric)
+        if value is not None:
+            out.append((metric, float(value)))
+    for idx, temp in enumerate(miner.get("board_temps") or []):
+        out.append((f"board_temp_{idx}", float(temp)))
+    return out
+
+
+class MetricsStore(SQLiteStore):
+    def __init__(self, path=METRICS_DB):
+        super().__init__(path)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+            for table, _, _ in ROLLUPS:
+                conn.executescript(_ROLLUP_SCHEMA.format(table=table))
+
+    def record(self, rows, now=None):
+        """
+        Batched insert. rows: iterable of (miner, metric, ts, value).
+        Raw rows and all rollups are written in a single transaction.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO samples (miner, metric, ts, value) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            for table, step, _ in ROLLUPS:
+                conn.executemany(
+                    _ROLLUP_UPSERT.format(table=table),
+                    [(m, k, ts - ts % step, v, v, v) for m, k, ts, v in rows],
+                )
+        now = now or time.time()
+        if now - self._last_prune > PRUNE_EVERY:
+            self.prune(now)
+        return len(rows)
+
+    def record_snapshot(self, snapshot):
+        """Poller hook: store every miner of a Snapshot"""
+        ts = int(snapshot.updated_at or time.time())
+        rows = []
+        for miner in snapshot.miners:
+            key = miner.get("miner") or miner.get("name", "").split(" ")[0]
+            for metric, value in miner_samples(miner):
+                rows.append((key, metric, ts, value))
+        return self.record(rows)
+
+    def prune(self, now=None):
+        """Apply retention policies"""
+        now = now or time.time()
+        conn = self._conn()
+        with self._write_lock, conn:
+            for table, _, retention in RESOLUTIONS:
+                if retention:
+                    conn.execute(f"DELETE FROM {table} WHERE ts < ?", (int(now - retention),))
+        self._last_prune = now
+
+    def pick_resolution(self, start, end, now=None):
+        """Finest table that still covers `start` and yields <= MAX_QUERY_POINTS"""
+        now = now or time.time()
+        span = max(1, end - start)
+        for table, step, retention in RESOLUTIONS:
+            if retention and start < now - retention:
+                continue
+            if step and span / step > MAX_QUERY_POINTS:
+                continue
+            if not step and span / 10 > MAX_QUERY_POINTS:
+                # raw samples arrive every poll interval (~10 s)
+                continue
+            return table, step
+        table, step, _ = RESOLUTIONS[-1]
+        return table, step
+
+    def query(self, miner, metric, start, end, table=None):
+        """
+        Returns (table, [(ts, avg, min, max), ...]) for one series.
+        Uses the primary key range scan only.
+        """
+        if table is None:
+            table, _ = self.pick_resolution(start, end)
+        conn = self._conn()
+        if table == "samples":
+            cur = conn.execute(
+                "SELECT ts, value, value, value FROM samples "
+                "WHERE miner = ? AND metric = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (miner, metric, int(start), int(end)),
+            )
+        else:
+            cur = conn.execute(
+                f"SELECT ts, sum / count, min, max FROM {table} "
+                "WHERE miner = ? AND metric = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (miner, metric, int(start), int(end)),
+            )
+        return table, cur.fetchall()
+
+    def history(self, miner, metric, start, end, points=300, mode="lttb"):
+        """Downsampled series for charts: (table, [(ts, value), ...])"""
+        table, rows = self.query(miner, metric, start, end)
+        if mode == "minmax":
+            return table, minmax_buckets(rows, points)
+        return table, lttb([(r[0], r[1]) for r in rows], points)
+
+    def metrics_for(self, miner):
+        conn = self._conn()
+        cur = conn.execute("SELECT DISTINCT metric FROM rollup_1d WHERE miner = ?", (miner,))
+        return sorted(r[0] for r in cur.fetchall())
+
+    def totals(self, miners, metrics, start, end):
+        """
+        {(miner, metric): sum of values} over [start, end] from the 1 min
+        rollups - for event-count series (e.g. log anomalies).
+        """
+        miners, metrics = list(miners), list(metrics)
+        if not miners or not metrics:
+            return {}
+        conn = self._conn()
+        cur = conn.execute(
+            "SELECT miner, metric, SUM(sum) FROM rollup_1m "
+            f"WHERE miner IN ({','.join('?' * len(miners))}) AND metric IN ({','.join('?' * len(metrics))}) "
+            "AND ts >= ? AND ts <= ? GROUP BY miner, metric",
+            miners + metrics + [int(start) - int(start) % 60, int(end)],
+        )
+        return {(m, k): total for m, k, total in cur.fetchall()}
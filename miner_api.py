@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+miner_api.py - asyncio client for the cgminer/btminer TCP JSON API.
+One event loop can talk to hundreds of miners concurrently; a response is
+considered complete as soon as the JSON document (or the trailing NUL the
+API appends) has arrived, instead of waiting for the socket timeout.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import deque, namedtuple
+
+SOCKET_TIMEOUT = 3.0
+READ_CHUNK = 4096
+# سقف اتصال‌های هم‌زمان در یک event loop
+MAX_CONCURRENCY = 256
+
+# فرم‌ویرهایی که دستور ترکیبی (summary+devs) را رد کرده‌اند: (ip, port) -> time
+BATCH_RETRY_SECONDS = 3600
+_batch_rejected = {}
+
+# bytes that can change the framing state: brackets, quotes, escapes, NUL
+_FRAME_TOKENS = re.compile(rb'[{}\[\]"\\\x00]')
+
+CallRecord = namedtuple("CallRecord", ["ip", "port", "command", "bytes", "seconds", "framed", "ok"])
+
+
+class CallStats:
+    """Bytes and wall time of every API call (bounded history + running totals)"""
+
+    def __init__(self, maxlen=1000):
+        self.recent = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.unframed = 0
+
+    def record(self, rec):
+        with self._lock:
+            self.recent.append(rec)
+            self.calls += 1
+            self.bytes += rec.bytes
+            self.seconds += rec.seconds
+            if not rec.framed:
+                self.unframed += 1
+
+    def summary(self):
+        with self._lock:
+            recent = list(self.recent)
+            calls, nbytes, seconds, unframed = self.calls, self.bytes, self.seconds, self.unframed
+        times = sorted(r.seconds for r in recent)
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))] if times else 0.0
+        return {
+            "calls": calls,
+            "bytes": nbytes,
+            "avg_ms": round(seconds / calls * 1000, 2) if calls else 0.0,
+            "p95_ms": round(p95 * 1000, 2),
+            # calls that ended on timeout/EOF instead of a detected frame end
+            "unframed": unframed,
+            "recent": [r._asdict() for r in recent[-20:]],
+        }
+
+
+stats = CallStats()
+
+
+class JsonFramer:
+    """
+    Incremental end-of-document detector. feed() chunks as they arrive; it
+    returns True once a top-level JSON value has closed (balanced brackets
+    outside strings) or a NUL terminator is seen. Each byte is scanned once.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.size = 0
+        self.end = None
+
+    def feed(self, chunk):
+        if self.end is not None:
+            return True
+        start = 0
+        if self.escaped:
+            # the escape started at the end of the previous chunk
+            start = 1
+            self.escaped = False
+        skip = -1
+        for m in _FRAME_TOKENS.finditer(chunk, start):
+            i = m.start()
+            if i == skip:
+                continue
+            c = chunk[i]
+            if self.in_string:
+                if c == 0x5C:  # backslash
+                    if i + 1 == len(chunk):
+                        self.escaped = True
+                    else:
+                        skip = i + 1
+                elif c == 0x22:
+                    self.in_string = False
+                continue
+            if c == 0x00:
+                self.end = self.size + i
+                break
+            if c == 0x22:
+                self.in_string = True
+            elif c in (0x7B, 0x5B):
+                self.depth += 1
+            elif c in (0x7D, 0x5D):
+                self.depth = max(0, self.depth - 1)
+                if self.depth == 0:
+                    self.end = self.size + i + 1
+                    break
+        self.size += len(chunk)
+        return self.end is not None
+
+
+def decode_response(raw):
+    """bytes -> dict (or None). Tolerates NUL terminators and junk around the JSON."""
+    if not raw:
+        return None
+    text = raw.replace(b"\x00", b"").decode("utf-8", errors="ignore").strip()
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except Exception:
+        first = text.find("{")
+        last = text.rfind("}")
+        if first != -1 and last != -1 and last > first:
+            try:
+                return json.loads(text[first:last + 1])
+            except Exception:
+                return None
+    return None
+
+
+async def _read_response(reader, timeout):
+    """Read until the framer sees the end of the document; returns (payload_bytes, framed)"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    framer = JsonFramer()
+    chunks = []
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            chunk = await asyncio.wait_for(reader.read(READ_CHUNK), remaining)
+        except asyncio.TimeoutError:
+            break
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if framer.feed(chunk):
+            break
+    buf = b"".join(chunks)
+    if framer.end is not None:
+        return buf[:framer.end], True
+    return buf, False
+
+
+async def request(ip, port, payload, timeout=SOCKET_TIMEOUT):
+    """Send one API command and return the decoded response dict (or None)"""
+    if not ip:
+        return None
+    started = time.perf_counter()
+    raw, framed = b"", False
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except Exception:
+        _record(ip, port, payload, raw, framed, started, None)
+        return None
+    try:
+        writer.write(json.dumps(payload).encode("utf-8"))
+        await writer.drain()
+        raw, framed = await _read_response(reader, timeout)
+    except Exception:
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+    result = decode_response(raw)
+    _record(ip, port, payload, raw, framed, started, result)
+    return result
+
+
+def _record(ip, port, payload, raw, framed, started, result):
+    stats.record(CallRecord(
+        ip=ip,
+        port=port,
+        command=payload.get("command") if isinstance(payload, dict) else None,
+        bytes=len(raw),
+        seconds=time.perf_counter() - started,
+        framed=framed,
+        ok=result is not None,
+    ))
+
+
+def _split_batch(resp, commands):
+    """{"summary": [{...}], "devs": [{...}], "id": 1} -> {"summary": {...}, "devs": {...}}"""
+    out = {}
+    if not isinstance(resp, dict):
+        return out
+    for name in commands:
+        part = resp.get(name)
+        if isinstance(part, list) and part:
+            part = part[0]
+        if isinstance(part, dict):
+            out[name] = part
+    return out
+
+
+async def request_many(ip, port, commands, timeout=SOCKET_TIMEOUT):
+    """
+    Fetch several commands from one miner, preferably as a single joined
+    command ("summary+devs"). Firmware that rejects joined commands is
+    remembered and queried per command until BATCH_RETRY_SECONDS pass.
+    Returns {command: response}; missing commands are simply absent.
+    """
+    if not ip or not commands:
+        return {}
+    key = (ip, port)
+    responses = {}
+    if len(commands) > 1:
+        rejected_at = _batch_rejected.get(key)
+        if rejected_at is None or time.time() - rejected_at > BATCH_RETRY_SECONDS:
+            resp = await request(ip, port, {"command": "+".join(commands)}, timeout)
+            responses = _split_batch(resp, commands)
+            if responses:
+                _batch_rejected.pop(key, None)
+            elif resp is not None:
+                # miner answered but not with the joined sections
+                _batch_rejected[key] = time.time()
+            else:
+                # no answer at all: either the miner is down or its firmware drops
+                # joined commands silently - one plain command tells them apart
+                probe = await request(ip, port, {"command": commands[0]}, timeout)
+                if not probe:
+                    return {}
+                _batch_rejected[key] = time.time()
+                responses[commands[0]] = probe
+    missing = [c for c in commands if c not in responses]
+    if missing:
+        replies = await asyncio.gather(
+            *(request(ip, port, {"command": c}, timeout) for c in missing)
+        )
+        for name, resp in zip(missing, replies):
+            if resp:
+                responses[name] = resp
+    return responses
+
+
+async def gather_limited(func, items, limit=MAX_CONCURRENCY):
+    """Run func(item) for every item with at most `limit` in flight; keeps order"""
+    sem = asyncio.Semaphore(limit)
+
+    async def _one(item):
+        async with sem:
+            return await func(item)
+
+    return await asyncio.gather(*(_one(item) for item in items), return_exceptions=True)
+
+
+def send_tcp_json(ip, port, payload, timeout=SOCKET_TIMEOUT):
+    """Blocking wrapper for callers outside an event loop (Flask routes)"""
+    if not ip:
+        return None
+    return asyncio.run(request(ip, port, payload, timeout))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+poller.py - Background collector that polls miners on an interval and
+publishes the latest result as a read-only snapshot for main.py routes.
+"""
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from shared import PeriodicWorker
+
+# miners: tuple of poll_miner dicts, updated_at: unix time of the cycle
+Snapshot = namedtuple("Snapshot", ["miners", "total_hashrate", "updated_at", "cycle"])
+
+EMPTY_SNAPSHOT = Snapshot(miners=(), total_hashrate=0, updated_at=None, cycle=0)
+
+# فیلدهایی که برای آپدیت زنده‌ی جدول به مرورگر فرستاده می‌شوند
+STREAM_FIELDS = ("alive", "hashrate", "hashrate_class", "board_temps", "board_temp_levels")
+
+
+class MinerPoller(PeriodicWorker):
+    thread_name = "miner-poller"
+
+    def __init__(self, collect, summarize, interval=10.0, first_wait=10.0):
+        """
+        collect   -> callable returning list of poll_miner dicts
+        summarize -> callable(miners) returning total hashrate
+        """
+        super().__init__(interval)
+        self.collect = collect
+        self.summarize = summarize
+        self.first_wait = first_wait
+        self._snapshot = EMPTY_SNAPSHOT
+        self._ready = threading.Event()
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """callback(snapshot) runs on the poller thread after every cycle"""
+        self._listeners.append(callback)
+
+    def snapshot(self):
+        """
+        Latest published snapshot. Only the very first call after startup
+        may block (up to first_wait) until the first cycle completes.
+        """
+        if not self._ready.is_set():
+            self._ready.wait(self.first_wait)
+        return self._snapshot
+
+    def poll_once(self):
+        miners = self.collect()
+        total = self.summarize(miners)
+        prev = self._snapshot
+        # swap the reference in one assignment - readers never see a partial cycle
+        self._snapshot = Snapshot(
+            miners=tuple(miners),
+            total_hashrate=total,
+            updated_at=time.time(),
+            cycle=prev.cycle + 1,
+        )
+        self._ready.set()
+        for callback in list(self._listeners):
+            try:
+                callback(self._snapshot)
+            except Exception as e:
+                print(f"💥 Poller listener failed: {e}")
+        return self._snapshot
+
+    run_once = poll_once
+
+    def cycle_failed(self, error):
+        super().cycle_failed(error)
+        # waiting readers get the empty snapshot instead of blocking
+        self._ready.set()
+
+
+def _miner_key(miner):
+    return miner.get("miner") or miner.get("name", "").split(" ")[0]
+
+
+def snapshot_diff(prev, curr, fields=STREAM_FIELDS):
+    """
+    Changed fields per miner between two snapshots:
+    {"cycle": n, "miners": {"131": {"hashrate": 91.2}}, "total_hashrate": ...}
+    Returns None when nothing the dashboard shows has changed.
+    """
+    before = {_miner_key(m): m for m in prev.miners}
+    changed = {}
+    for miner in curr.miners:
+        key = _miner_key(miner)
+        old = before.get(key, {})
+        delta = {f: miner.get(f) for f in fields if old.get(f) != miner.get(f)}
+        # values travel with their precomputed class so the browser never re-derives it
+        for value_field, class_field in (("hashrate", "hashrate_class"), ("board_temps", "board_temp_levels")):
+            if value_field in delta:
+                delta[class_field] = miner.get(class_field)
+        if delta:
+            changed[key] = delta
+    event = {"cycle": curr.cycle}
+    if changed:
+        event["miners"] = changed
+    if prev.total_hashrate != curr.total_hashrate:
+        event["total_hashrate"] = curr.total_hashrate
+    if len(event) == 1:
+        return None
+    return event
+
+
+class ChangeFeed:
+    """Fan-out of snapshot diffs to stream listeners (one bounded queue each)"""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._queues = set()
+        self._lock = threading.Lock()
+        self._last = EMPTY_SNAPSHOT
+
+    def listen(self):
+        q = queue.Queue(maxsize=self.max_pending)
+        # first event brings a new listener up to date; baseline and
+        # registration share the lock, so the next publish diffs from it
+        with self._lock:
+            initial = snapshot_diff(EMPTY_SNAPSHOT, self._last)
+            if initial:
+                q.put_nowait(initial)
+            self._queues.add(q)
+        return q
+
+    def unlisten(self, q):
+        with self._lock:
+            self._queues.discard(q)
+
+    def publish(self, snapshot):
+        """Poller hook"""
+        with self._lock:
+            event = snapshot_diff(self._last, snapshot)
+            self._last = snapshot
+            if not event:
+                return
+            listeners = list(self._queues)
+        for q in listeners:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # slow client - drop it and end its stream (None); the browser
+                # reconnects and gets a full state from listen()
+                self.unlisten(q)
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(None)
+                except queue.Full:
+                    pass
@@ -2,8 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import os
-import requests
-from bs4 import BeautifulSoup
+
+from luci_session import luci_sessions, input_value
+from bulk import run_bulk, BULK_MAX_WORKERS, BULK_MINER_TIMEOUT
 
 # Pool Configuration - Easy to change
 POOL1_URL = "stratum+tcp://sha256.poolbinance.com:443"
@@ -46,78 +47,67 @@ MINER_NAMES = {
     "65": "65TH", "66": "66TH", "70": "70TH"
 }
 
-def login_to_miner(miner_name, username, password):
-    """Login to miner and return session"""
+def _miner_base(miner_name):
     miner_port = port_map.get(miner_name)
     if not miner_port:
+        return None
+    return f"https://{MINER_IP}:{miner_port}"
+
+def login_to_miner(miner_name, username, password):
+    """Login to miner and return session (reused from the shared LuCI pool)"""
+    base = _miner_base(miner_name)
+    if not base:
         print(f"❌ Port not found for miner {miner_name}")
         return None
-    
-    base_url = f"https://{MINER_IP}:{miner_port}"
-    login_url = f"{base_url}/cgi-bin/luci"
-    
-    session = requests.Session()
-    session.verify = False
-    requests.packages.urllib3.disable_warnings()
-    
-    try:
-        print(f"🔐 Attempting login to miner {miner_name}...")
-        response = session.get(login_url, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        login_data = {
-            'luci_username': username,
-            'luci_password': password
-        }
-        
-        login_response = session.post(login_url, data=login_data, timeout=10, allow_redirects=False)
-        
-        if login_response.status_code in [302, 303]:
-            print(f"✅ Successfully logged into miner {miner_name}")
-            return session
-        else:
-            print(f"❌ Login failed for miner {miner_name} - Status: {login_response.status_code}")
-            return None
-    except Exception as e:
-        print(f"❌ Login error for miner {miner_name}: {str(e)}")
+    entry, err = luci_sessions.session(base, username, password)
+    if not entry:
+        print(f"❌ Login failed for miner {miner_name} - {err}")
         return None
+    return entry.http
 
 def update_miner_pools(miner_name, pools_data, username, password):
     """Update pool settings for a miner"""
     print(f"🔄 Starting pool update for miner {miner_name}...")
     
-    session = login_to_miner(miner_name, username, password)
-    if not session:
+    base = _miner_base(miner_name)
+    if not base:
+        print(f"❌ Port not found for miner {miner_name}")
         return {"error": "Login failed"}
     
+    pool_path = "/cgi-bin/luci/admin/network/btminer"
     try:
-        miner_port = port_map.get(miner_name)
-        pool_url_page = f"https://{MINER_IP}:{miner_port}/cgi-bin/luci/admin/network/btminer"
-        
-        print(f"📄 Loading pool configuration page for {miner_name}...")
-        response = session.get(pool_url_page, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        token_input = soup.find('input', {'name': 'token'})
-        if not token_input:
-            return {"error": "Cannot find form token"}
-        
-        token = token_input.get('value')
-        form_data = {
-            'token': token,
-            'cbi.submit': '1',
-            'cbi.apply': 'Save & Apply'
-        }
-        
-        # Add pool data to form
-        print(f"📝 Applying pool settings for {miner_name}...")
-        for pool_num, pool_info in pools_data.items():
-            form_data[f'cbid.pools.default.pool{pool_num}url'] = pool_info['url']
-            form_data[f'cbid.pools.default.pool{pool_num}user'] = pool_info['worker']
-            form_data[f'cbid.pools.default.pool{pool_num}pw'] = pool_info['password']
-            print(f"   Pool {pool_num}: {pool_info['url']}")
-        
-        update_response = session.post(pool_url_page, data=form_data, timeout=10)
+        # قفل هر ماینر: GET توکن و POST فرم روی یک session
+        with luci_sessions.lock(base):
+            for attempt in range(2):
+                # token of the warm session is reused; the page is loaded only on a miss
+                token, _, err = luci_sessions.token(base, username, password, pool_path, input_value)
+                if err:
+                    print(f"❌ Login failed for miner {miner_name} - {err}")
+                    return {"error": "Login failed"}
+                if not token:
+                    return {"error": "Cannot find form token"}
+                
+                form_data = {
+                    'token': token,
+                    'cbi.submit': '1',
+                    'cbi.apply': 'Save & Apply'
+                }
+                
+                # Add pool data to form
+                print(f"📝 Applying pool settings for {miner_name}...")
+                for pool_num, pool_info in pools_data.items():
+                    form_data[f'cbid.pools.default.pool{pool_num}url'] = pool_info['url']
+                    form_data[f'cbid.pools.default.pool{pool_num}user'] = pool_info['worker']
+                    form_data[f'cbid.pools.default.pool{pool_num}pw'] = pool_info['password']
+                    print(f"   Pool {pool_num}: {pool_info['url']}")
+                
+                update_response, err = luci_sessions.request(base, username, password, "POST", pool_path, data=form_data, timeout=10)
+                if err:
+                    return {"error": f"Connection error: {err}"}
+                if update_response.status_code == 200:
+                    break
+                # rejected token - read a fresh one from the page once
+                luci_sessions.forget_token(base, username)
         
         if update_response.status_code == 200:
             print(f"✅ Pools successfully updated for miner {miner_name}")
@@ -130,6 +120,39 @@ def update_miner_pools(miner_name, pools_data, username, password):
         print(f"❌ Connection error for {miner_name}: {str(e)}")
         return {"error": f"Connection error: {str(e)}"}
 
+def pools_for_miner(pools_data, miner_name, worker_template=None):
+    """Copy of pools_data with the worker name built from a template like 'Ali.{miner}'"""
+    out = {}
+    for pool_num, pool_info in pools_data.items():
+        info = dict(pool_info)
+        if worker_template:
+            info['worker'] = worker_template.replace('{miner}', miner_name)
+        out[pool_num] = info
+    return out
+
+def bulk_update_miner_pools(miner_names, pools_data, username, password, worker_template=None,
+                            max_workers=BULK_MAX_WORKERS, timeout=BULK_MINER_TIMEOUT):
+    """
+    Update pools on many miners concurrently.
+    Yields one progress dict per miner as soon as it finishes.
+    """
+    def _update(miner_name):
+        return update_miner_pools(miner_name, pools_for_miner(pools_data, miner_name, worker_template), username, password)
+
+    total = len(miner_names)
+    done = 0
+    for miner_name, result, error in run_bulk(_update, miner_names, max_workers, timeout):
+        done += 1
+        if error:
+            result = {"error": error}
+        yield {
+            "miner": miner_name,
+            "success": bool(result.get("success")),
+            "message": result.get("success") or result.get("error", ""),
+            "done": done,
+            "total": total
+        }
+
 def get_pools_manager_html():
     """Return HTML for pools management interface"""
     return f'''
@@ -772,61 +795,84 @@ def get_pools_manager_html():
 
         showNotification('🚀 Starting pool configuration update...', 'info');
         
-        // Update miners sequentially
-        updateMinersSequentially(selectedMiners, poolsData, 0, progressBar, progressText);
+        // همه‌ی ماینرها به‌صورت موازی سمت سرور؛ پیشرفت هر ماینر به‌صورت NDJSON استریم می‌شود
+        const mainWorker = poolsData[1].worker.split('.')[0]; // گرفتن بخش اول (مثلاً Ali)
+        updateMinersBulk(selectedMiners.slice(), poolsData, mainWorker + '.{{miner}}', progressBar, progressText);
     }}
 
-    function updateMinersSequentially(miners, poolsData, currentIndex, progressBar, progressText) {{
-        if (currentIndex >= miners.length) {{
+    function updateMinersBulk(miners, poolsData, workerTemplate, progressBar, progressText) {{
+        let failed = 0;
+
+        function handleProgress(item) {{
+            const progress = (item.done / item.total) * 100;
+            progressBar.style.width = progress + '%';
+            progressText.textContent = Math.round(progress) + '%';
+            if (item.success) {{
+                showNotification(`✅ ${{item.message}}`, 'success');
+            }} else {{
+                failed++;
+                showNotification(`❌ Miner ${{item.miner}}: ${{item.message}}`, 'error');
+            }}
+        }}
+
+        function finish() {{
             progressBar.style.width = '100%';
             progressText.textContent = '100%';
             setTimeout(() => {{
-                showNotification('✅ All pool settings updated successfully!', 'success');
+                if (failed === 0) {{
+                    showNotification('✅ All pool settings updated successfully!', 'success');
+                }} else {{
+                    showNotification(`⚠️ ${{failed}} of ${{miners.length}} miners failed`, 'error');
+                }}
                 closePoolsModal();
                 // Reset form
                 document.querySelectorAll('input[type="text"]').forEach(input => input.value = '');
                 deselectAll();
             }}, 1000);
-            return;
         }}
 
-        const miner = miners[currentIndex];
-        const progress = ((currentIndex + 1) / miners.length) * 100;
-        progressBar.style.width = progress + '%';
-        progressText.textContent = Math.round(progress) + '%';
-
-        showNotification(`🔄 Configuring Miner ${{miner}} (${{currentIndex + 1}}/${{miners.length}})`, 'info');
-
-        // برای هر ماینر worker مخصوص خودش رو تنظیم کن
-        const minerPoolsData = JSON.parse(JSON.stringify(poolsData));
-        const mainWorker = minerPoolsData[1].worker.split('.')[0]; // گرفتن بخش اول (مثلاً Ali)
-        
-        for (let poolNum in minerPoolsData) {{
-            minerPoolsData[poolNum].worker = mainWorker + '.' + miner; // مثلاً Ali.131
-        }}
-
-        fetch('/update_pools', {{
+        fetch('/update_pools_bulk', {{
             method: 'POST',
             headers: {{'Content-Type': 'application/json'}},
             body: JSON.stringify({{
-                miner: miner,
-                pools: minerPoolsData
+                miners: miners,
+                pools: poolsData,
+                worker_template: workerTemplate
             }})
         }})
-        .then(response => response.json())
-        .then(data => {{
-            if (data.success) {{
-                showNotification(`✅ ${{data.success}}`, 'success');
-            }} else {{
-                showNotification(`❌ Miner ${{miner}}: ${{data.error}}`, 'error');
+        .then(response => {{
+            const type = response.headers.get('Content-Type') || '';
+            if (!response.ok || !type.includes('ndjson')) {{
+                // rejected request ({{"error": ...}}) - no progress stream follows
+                return response.json().catch(() => ({{}})).then(data => {{
+                    throw new Error(data.error || `HTTP ${{response.status}}`);
+                }});
+            }}
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            function pump() {{
+                return reader.read().then(({{done, value}}) => {{
+                    if (value) {{
+                        buffer += decoder.decode(value, {{stream: true}});
+                        const lines = buffer.split('\\n');
+                        buffer = lines.pop();
+                        lines.filter(l => l.trim()).forEach(l => handleProgress(JSON.parse(l)));
+                    }}
+                    if (done) {{
+                        if (buffer.trim()) handleProgress(JSON.parse(buffer));
+                        finish();
+                        return;
+                    }}
+                    return pump();
+                }});
             }}
-            // Move to next miner
-            updateMinersSequentially(miners, poolsData, currentIndex + 1, progressBar, progressText);
+            return pump();
         }})
         .catch(error => {{
-            showNotification(`❌ Error updating miner ${{miner}}: ${{error}}`, 'error');
-            // Continue with next miner even if this one fails
-            updateMinersSequentially(miners, poolsData, currentIndex + 1, progressBar, progressText);
+            progressBar.style.width = '0%';
+            progressText.textContent = '0%';
+            showNotification(`❌ Bulk update error: ${{error.message || error}}`, 'error');
         }});
     }}
 
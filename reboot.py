@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
 import os
+import threading
+import time
+import uuid
 import requests
-from bs4 import BeautifulSoup
+
+from luci_session import luci_sessions, script_token
+from bulk import run_bulk
+from miner_api import gather_limited
 
 # ---------------- Config ----------------
 MINER_IP = os.environ.get("MINER_IP", "185.135.229.121")
@@ -33,87 +40,277 @@ MINER_ICONS = {
 }
 
 # ---------------- Miner control (server-side) ----------------
-def login_to_miner(miner_name, username=MINER_USERNAME, password=MINER_PASSWORD):
-    """
-    Open a session to miner and attempt login. Return requests.Session or None.
-    """
+def _miner_base(miner_name):
     miner_port = port_map.get(miner_name)
     if not miner_port:
         return None
-    base_url = f"https://{MINER_IP}:{miner_port}"
-    login_url = f"{base_url}/cgi-bin/luci"
-    session = requests.Session()
-    session.verify = False
-    requests.packages.urllib3.disable_warnings()
-    try:
-        # try initial GET (some firmwares need it)
-        session.get(login_url, timeout=6)
-        payload = {"luci_username": username, "luci_password": password}
-        lr = session.post(login_url, data=payload, timeout=8, allow_redirects=False)
-        if lr.status_code in (302, 303):
-            return session
-        # Some firmwares might return 200 but still login — but to be conservative return None
-        return None
-    except Exception:
+    return f"https://{MINER_IP}:{miner_port}"
+
+def login_to_miner(miner_name, username=MINER_USERNAME, password=MINER_PASSWORD):
+    """
+    Return an authenticated requests.Session from the shared LuCI pool, or None.
+    """
+    base = _miner_base(miner_name)
+    if not base:
         return None
+    entry, _ = luci_sessions.session(base, username, password)
+    return entry.http if entry else None
+
+REBOOT_PAGE = "/cgi-bin/luci/admin/system/reboot"
+
 
 def reboot_miner(miner_name, username=MINER_USERNAME, password=MINER_PASSWORD):
     """
     Perform reboot on miner using session login -> token extraction -> POST reboot.
     Returns dict: {"status":"success","message": "..."} or {"status":"error","message":"..."}
     """
-    session = login_to_miner(miner_name, username, password)
-    if not session:
-        return {"status": "error", "message": "Login failed"}
-
-    miner_port = port_map.get(miner_name)
-    if not miner_port:
+    base = _miner_base(miner_name)
+    if not base:
         return {"status": "error", "message": "Unknown miner port"}
 
     try:
-        reboot_page = f"https://{MINER_IP}:{miner_port}/cgi-bin/luci/admin/system/reboot"
-        r = session.get(reboot_page, timeout=8)
-        if r.status_code != 200:
-            return {"status": "error", "message": f"Failed to load reboot page (status {r.status_code})"}
-
-        soup = BeautifulSoup(r.text, "html.parser")
-        token_script = None
-        for s in soup.find_all("script"):
-            if s.string and "token" in s.string:
-                token_script = s.string
-                break
-        if not token_script:
-            return {"status": "error", "message": "Cannot find reboot token in page"}
-
-        start = token_script.find("token: '")
-        if start == -1:
-            return {"status": "error", "message": "Token pattern not found in script"}
-        start += len("token: '")
-        end = token_script.find("'", start)
-        token = token_script[start:end]
-        if not token:
-            return {"status": "error", "message": "Token extraction failed"}
-
-        reboot_api = f"https://{MINER_IP}:{miner_port}/cgi-bin/luci/admin/system/reboot/call"
-        # try form-encoded first (most luci-like endpoints expect form)
-        try:
-            resp = session.post(reboot_api, data={"token": token}, timeout=10)
-            if resp.status_code == 200:
-                return {"status": "success", "message": f"Miner {miner_name} reboot initiated"}
-            # fallback: try sending JSON body (some devices may accept)
-            resp2 = session.post(reboot_api, json={"token": token}, timeout=10)
-            if resp2.status_code == 200:
-                return {"status": "success", "message": f"Miner {miner_name} reboot initiated (json)"}
-            return {"status": "error", "message": f"Reboot failed: status {resp.status_code}/{resp2.status_code}"}
-        except requests.exceptions.ConnectTimeout:
-            return {"status": "error", "message": "Connection timed out"}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        with luci_sessions.lock(base):
+            reboot_api = "/cgi-bin/luci/admin/system/reboot/call"
+            for attempt in range(2):
+                # the session token is the same one the reboot page embeds
+                token, _, err = luci_sessions.token(base, username, password, REBOOT_PAGE, script_token, timeout=8)
+                if err:
+                    if err.startswith("Page load error"):
+                        return {"status": "error", "message": f"Failed to load reboot page ({err})"}
+                    return {"status": "error", "message": "Login failed"}
+                if not token:
+                    return {"status": "error", "message": "Cannot find reboot token in page"}
+
+                try:
+                    # form-encoded first (most luci-like endpoints), JSON as fallback;
+                    # whichever worked last time on this miner is tried first
+                    bodies = ["data", "json"]
+                    if luci_sessions.layout(base, "reboot_body") == "json":
+                        bodies.reverse()
+                    statuses = []
+                    for body in bodies:
+                        resp, err = luci_sessions.request(base, username, password, "POST", reboot_api, timeout=10, **{body: {"token": token}})
+                        if err:
+                            return {"status": "error", "message": err}
+                        if resp.status_code == 200:
+                            luci_sessions.remember_layout(base, "reboot_body", body)
+                            # session dies with the reboot
+                            luci_sessions.invalidate(base)
+                            suffix = " (json)" if body == "json" else ""
+                            return {"status": "success", "message": f"Miner {miner_name} reboot initiated{suffix}"}
+                        statuses.append(str(resp.status_code))
+                except requests.exceptions.ConnectTimeout:
+                    return {"status": "error", "message": "Connection timed out"}
+                except Exception as e:
+                    return {"status": "error", "message": str(e)}
+
+                # rejected token - read it again from the reboot page once
+                luci_sessions.forget_token(base, username)
+            return {"status": "error", "message": f"Reboot failed: status {'/'.join(statuses)}"}
     except requests.exceptions.ConnectTimeout:
         return {"status": "error", "message": "Connection timed out while loading reboot page"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+# ---------------- Rolling-wave reboot jobs ----------------
+REBOOT_WAVE_SIZE = 3
+REBOOT_MAX_CONCURRENCY = 3
+# بعد از ریبوت: صبر تا آفلاین شدن (حداکثر) و سپس تا آنلاین شدن دوباره
+REBOOT_DOWN_GRACE = 60
+REBOOT_ONLINE_TIMEOUT = 900
+REBOOT_CHECK_EVERY = 10
+REBOOT_PROBE_CONCURRENCY = 16
+# finished jobs stay queryable this long
+REBOOT_JOB_TTL = 24 * 3600
+
+
+class RebootJob:
+    def __init__(self, miners, wave_size, max_concurrency, username, password):
+        self.id = uuid.uuid4().hex[:12]
+        self.miners = list(miners)
+        self.wave_size = max(1, int(wave_size))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.username = username
+        self.password = password
+        self.waves = [self.miners[i:i + self.wave_size] for i in range(0, len(self.miners), self.wave_size)]
+        self.current_wave = 0
+        # queued -> running -> done | paused (a miner did not come back) | cancelled
+        self.status = "queued"
+        self.message = ""
+        self.results = {m: {"state": "pending", "message": ""} for m in self.miners}
+        self.created = time.time()
+        self.finished = None
+        self.lock = threading.Lock()  # guards status changes that start/stop the job thread
+        self._cancel = threading.Event()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def wait_cancel(self, timeout):
+        """Sleep up to `timeout` seconds; True as soon as a cancel is requested"""
+        return self._cancel.wait(timeout)
+
+    def set(self, miner, state, message=""):
+        self.results[miner] = {"state": state, "message": message}
+
+    def to_dict(self):
+        done = sum(1 for r in self.results.values() if r["state"] in ("online", "failed", "timeout"))
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "message": self.message,
+            "wave": self.current_wave + 1 if self.waves else 0,
+            "waves": len(self.waves),
+            "wave_size": self.wave_size,
+            "max_concurrency": self.max_concurrency,
+            "done": done,
+            "total": len(self.miners),
+            "results": self.results,
+            "created": self.created,
+            "finished": self.finished
+        }
+
+
+class RebootScheduler:
+    """
+    Reboots miners in waves: each wave is rebooted in parallel (bounded by
+    max_concurrency) and the next wave starts only after every miner of the
+    current one answers the TCP summary API again.
+    """
+
+    def __init__(self, is_online, reboot_func=None):
+        self.is_online = is_online  # async callable(miner_name) -> bool
+        self.reboot_func = reboot_func or reboot_miner
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, miners, wave_size=REBOOT_WAVE_SIZE, max_concurrency=REBOOT_MAX_CONCURRENCY,
+               username=MINER_USERNAME, password=MINER_PASSWORD):
+        job = RebootJob(miners, wave_size, max_concurrency, username, password)
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        with job.lock:
+            self._start(job)
+        return job
+
+    def _prune(self, now=None):
+        """Drop jobs that finished more than REBOOT_JOB_TTL ago"""
+        now = now or time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and now - job.finished > REBOOT_JOB_TTL:
+                del self.jobs[job_id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job:
+            with job.lock:
+                if job.status in ("queued", "running"):
+                    # takes effect before the next wave and cuts an online wait short
+                    job._cancel.set()
+        return job
+
+    def resume(self, job_id):
+        """Continue a paused/cancelled job from the first wave that is not finished"""
+        job = self.jobs.get(job_id)
+        if not job:
+            return job
+        with job.lock:
+            # a second resume sees "running" and leaves the job alone
+            if job.status in ("paused", "cancelled"):
+                job._cancel.clear()
+                self._start(job)
+        return job
+
+    def _start(self, job):
+        """Start the job thread; the caller holds job.lock"""
+        job.status = "running"
+        job.message = ""
+        job.finished = None
+        threading.Thread(target=self._run, args=(job,), name=f"reboot-job-{job.id}", daemon=True).start()
+
+    def _run(self, job):
+        try:
+            while job.current_wave < len(job.waves):
+                if job.cancel_requested:
+                    job.status = "cancelled"
+                    job.message = f"Cancelled before wave {job.current_wave + 1}"
+                    return
+                wave = [m for m in job.waves[job.current_wave] if job.results[m]["state"] != "online"]
+                if not self._run_wave(job, wave):
+                    if job.cancel_requested:
+                        job.status = "cancelled"
+                        job.message = f"Cancelled during wave {job.current_wave + 1}"
+                    return
+                job.current_wave += 1
+            job.status = "done"
+            job.message = "All waves finished"
+        except Exception as e:
+            job.status = "paused"
+            job.message = f"Scheduler error: {e}"
+        finally:
+            if job.status in ("done", "cancelled", "paused"):
+                job.finished = time.time()
+
+    def _run_wave(self, job, wave):
+        for m in wave:
+            job.set(m, "rebooting")
+
+        def _reboot(miner):
+            return self.reboot_func(miner, job.username, job.password)
+
+        rebooted = []
+        for miner, result, error in run_bulk(_reboot, wave, job.max_concurrency):
+            if error or not result or result.get("status") != "success":
+                job.set(miner, "failed", error or (result or {}).get("message", "Unknown error"))
+            else:
+                job.set(miner, "waiting", result.get("message", ""))
+                rebooted.append(miner)
+
+        if rebooted:
+            self._wait_online(job, rebooted)
+        if job.cancel_requested:
+            # miners still on their way back are not stuck - the wait was cut short
+            return False
+
+        stuck = [m for m in wave if job.results[m]["state"] != "online"]
+        if stuck:
+            # keep the hashrate dip bounded: don't take down the next wave
+            job.status = "paused"
+            job.message = f"Wave {job.current_wave + 1}: {', '.join(stuck)} not back online"
+            return False
+        return True
+
+    def _wait_online(self, job, miners):
+        started = time.monotonic()
+        went_down = set()
+        waiting = set(miners)
+        while waiting:
+            if job.cancel_requested:
+                return
+            elapsed = time.monotonic() - started
+            if elapsed > REBOOT_ONLINE_TIMEOUT:
+                for m in waiting:
+                    job.set(m, "timeout", "Did not come back online")
+                return
+            if job.wait_cancel(REBOOT_CHECK_EVERY):
+                return
+            # all miners of the wave are probed at once
+            probed = list(waiting)
+            states = asyncio.run(gather_limited(self.is_online, probed, REBOOT_PROBE_CONCURRENCY))
+            for m, online in zip(probed, states):
+                if online is not True:
+                    went_down.add(m)
+                    continue
+                # a miner that still answers right after the reboot call has not restarted yet
+                if m in went_down or time.monotonic() - started > REBOOT_DOWN_GRACE:
+                    job.set(m, "online", "Back online")
+                    waiting.discard(m)
+
 # ---------------- HTML/JS/CSS generation (safe strings, no f-strings wrapping full block) ----------------
 def generate_miner_groups_html():
     parts = []
@@ -177,6 +374,10 @@ def get_reboot_manager_html():
 
     <div class="confirmation-section">
       <div><span id="selectedCount">0</span> miners selected</div>
+      <div class="wave-controls">
+        <label>Wave size <input type="number" id="rebootWaveSize" min="1" value="3"></label>
+        <label>Max parallel <input type="number" id="rebootMaxConcurrency" min="1" value="3"></label>
+      </div>
       <div class="confirmation-actions">
         <button id="confirmRebootBtn" class="btn-confirm" onclick="confirmReboot()" disabled>CONFIRM REBOOT</button>
         <button id="startRebootBtn" class="btn-start" onclick="startRebootProcess()" style="display:none">START REBOOT PROCESS</button>
@@ -282,14 +483,61 @@ def get_reboot_manager_html():
     return fetch(url, Object.assign({}, opts, { signal })).finally(() => clearTimeout(timer));
   }
 
+  // server-side job: reboots run in waves even if this tab is closed
+  let pollTimer = null;
+
+  function renderJob(job) {
+    const pct = job.total ? Math.round((job.done / job.total) * 100) : 0;
+    document.getElementById('rebootProgress').style.width = pct + '%';
+    document.getElementById('rebootProgressText').textContent = pct + '%';
+    document.getElementById('rebootStatus').textContent =
+      'Job ' + job.job_id + ' - wave ' + job.wave + '/' + job.waves + ' - ' + job.status + (job.message ? ': ' + job.message : '');
+    const labels = {pending: 'Pending', rebooting: 'Rebooting...', waiting: '⏳ Waiting to come back online',
+                    online: '✅ Back online', failed: '❌ Failed', timeout: '❌ Not back online'};
+    Object.keys(job.results).forEach(m => {
+      const row = document.getElementById('status_row_' + m);
+      const r = job.results[m];
+      if (row) row.textContent = 'Miner ' + m + ': ' + (labels[r.state] || r.state) + (r.message && r.state !== 'online' ? ' - ' + r.message : '');
+    });
+  }
+
+  function finishJob(job) {
+    results = Object.keys(job.results).map(m => ({
+      miner: m, ok: job.results[m].state === 'online', msg: job.results[m].message || job.results[m].state
+    }));
+    showSummary();
+    setTimeout(() => {
+      document.getElementById('startRebootBtn').style.display = 'none';
+      const confirmBtn = document.getElementById('confirmRebootBtn');
+      if (confirmBtn) confirmBtn.style.display = 'inline-block';
+    }, 800);
+  }
+
+  function pollJob(jobId) {
+    clearTimeout(pollTimer);
+    fetchWithTimeout('/reboot_jobs/' + jobId, {}, 12000)
+      .then(res => res.json())
+      .then(job => {
+        if (job.error) throw new Error(job.error);
+        renderJob(job);
+        if (job.status === 'running' || job.status === 'queued') {
+          pollTimer = setTimeout(() => pollJob(jobId), 2000);
+        } else {
+          finishJob(job);
+        }
+      })
+      .catch(err => {
+        document.getElementById('rebootStatus').textContent = '⚠️ Status error: ' + (err && err.message ? err.message : err) + ' - retrying';
+        pollTimer = setTimeout(() => pollJob(jobId), 5000);
+      });
+  }
+
   window.startRebootProcess = function() {
     updateSelection();
     if (selected.length === 0) { alert('No miners selected'); return; }
-    const total = selected.length;
-    let idx = 0;
     document.getElementById('rebootProgress').style.width = '0%';
     document.getElementById('rebootProgressText').textContent = '0%';
-    document.getElementById('rebootStatus').textContent = 'Starting reboot sequence...';
+    document.getElementById('rebootStatus').textContent = 'Starting reboot job...';
 
     // prepare status rows
     const progressSection = document.getElementById('rebootSummary');
@@ -303,56 +551,21 @@ def get_reboot_manager_html():
       progressSection.appendChild(r);
     });
 
-    function next() {
-      if (idx >= total) {
-        document.getElementById('rebootProgress').style.width = '100%';
-        document.getElementById('rebootProgressText').textContent = '100%';
-        document.getElementById('rebootStatus').textContent = '✅ Finished. See summary below.';
-        // show condensed summary (succeeded/failed)
-        showSummary();
-        setTimeout(() => {
-          document.getElementById('startRebootBtn').style.display = 'none';
-          const confirmBtn = document.getElementById('confirmRebootBtn');
-          if (confirmBtn) confirmBtn.style.display = 'inline-block';
-        }, 800);
-        return;
-      }
-
-      const miner = selected[idx];
-      const row = document.getElementById('status_row_' + miner);
-      if (row) row.textContent = 'Miner ' + miner + ': Rebooting...';
-      // call server endpoint
-      fetchWithTimeout('/reboot_miner', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({ miner: miner })
-      }, 12000).then(res => {
-        if (!res || !res.ok) throw new Error('Network/HTTP ' + (res ? res.status : 'unknown'));
-        return res.json();
-      }).then(data => {
-        if (data && data.status === 'success') {
-          if (row) row.textContent = 'Miner ' + miner + ': ✅ ' + (data.message || 'OK');
-          results.push({ miner: miner, ok: true, msg: data.message || 'OK' });
-        } else {
-          const msg = (data && (data.message || data.error)) || 'Unknown error';
-          if (row) row.textContent = 'Miner ' + miner + ': ❌ ' + msg;
-          results.push({ miner: miner, ok: false, msg: msg });
-        }
-      }).catch(err => {
-        const msg = (err && err.name === 'AbortError') ? 'Timeout' : (err && err.message ? err.message : 'Network error');
-        if (row) row.textContent = 'Miner ' + miner + ': ❌ ' + msg;
-        results.push({ miner: miner, ok: false, msg: msg });
-      }).finally(() => {
-        idx++;
-        const pct = Math.round((idx / total) * 100);
-        document.getElementById('rebootProgress').style.width = pct + '%';
-        document.getElementById('rebootProgressText').textContent = pct + '%';
-        // small safe delay between miners
-        setTimeout(next, 1000);
-      });
-    }
-
-    next();
+    fetchWithTimeout('/reboot_jobs', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({
+        miners: selected,
+        wave_size: parseInt(document.getElementById('rebootWaveSize').value, 10) || 3,
+        max_concurrency: parseInt(document.getElementById('rebootMaxConcurrency').value, 10) || 3
+      })
+    }, 12000).then(res => res.json()).then(job => {
+      if (job.error) throw new Error(job.error);
+      renderJob(job);
+      pollJob(job.job_id);
+    }).catch(err => {
+      document.getElementById('rebootStatus').textContent = '❌ ' + (err && err.message ? err.message : 'Network error');
+    });
   };
 
   function transientNotify(type, text) {
@@ -454,6 +667,8 @@ def get_reboot_manager_html():
 #poolsRebootContainer .confirmation-section { display:flex; justify-content:space-between; align-items:center; gap:12px; margin-top:8px; }
 #poolsRebootContainer .btn-confirm, #poolsRebootContainer .btn-start { padding:8px 12px; border-radius:8px; border:none; font-weight:700; cursor:pointer; }
 #poolsRebootContainer .btn-confirm { background:#2563eb; color:white; }
+#poolsRebootContainer .wave-controls { display:flex; gap:10px; font-size:12px; color:#9ca3af; }
+#poolsRebootContainer .wave-controls input { width:52px; padding:4px; border-radius:6px; border:1px solid #1f2937; background:#0b1220; color:#e6eef8; }
 #poolsRebootContainer .btn-start { background:#10b981; color:white; }
 
 #poolsRebootContainer .progress-bar { width:100%; height:14px; background:#071426; border-radius:8px; overflow:hidden; margin-top:8px; }
@@ -475,4 +690,4 @@ def get_reboot_manager_html():
     return html_top + html_mid + html_bottom
 
 # exported symbols for main.py to import
-__all__ = ["reboot_miner", "get_reboot_manager_html"]
\ No newline at end of file
+__all__ = ["reboot_miner", "RebootScheduler", "get_reboot_manager_html"]
\ No newline at end of file
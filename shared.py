@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+shared.py - Building blocks of the background collectors and SQLite stores.
+
+PeriodicWorker runs one cycle per interval on a daemon thread (MinerPoller,
+LogCollector); SQLiteStore keeps one WAL connection per thread next to a
+single write lock (MetricsStore, LogArchive).
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class PeriodicWorker:
+    """Daemon thread calling run_once() every `interval` seconds until stop()"""
+
+    thread_name = "worker"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def ensure_started(self):
+        """Start the thread once (safe to call from every request)"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def cycle_failed(self, error):
+        print(f"💥 {self.thread_name} cycle failed: {error}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                self.cycle_failed(e)
+            elapsed = time.monotonic() - started
+            self._stop.wait(max(0.0, self.interval - elapsed))
+
+
+class SQLiteStore:
+    """SQLite file in WAL mode: one connection per thread, writes serialised"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._last_prune = 0.0
+        self._conn().execute("PRAGMA journal_mode=WAL")
+
+    def _conn(self):
+        # one connection per thread; WAL lets readers run next to the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -2,43 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import json
-import socket
 
-def send_tcp_json(ip, port, payload, timeout=3.0):
-    """ارسال دستور به ماینر از طریق TCP"""
-    if not ip:
-        return None
-    data = json.dumps(payload).encode("utf-8")
-    try:
-        with socket.create_connection((ip, port), timeout=timeout) as s:
-            s.settimeout(timeout)
-            s.sendall(data)
-            chunks = []
-            while True:
-                try:
-                    chunk = s.recv(4096)
-                    if not chunk:
-                        break
-                    chunks.append(chunk)
-                except socket.timeout:
-                    break
-            raw = b"".join(chunks).decode("utf-8", errors="ignore").strip()
-            if not raw:
-                return None
-            try:
-                return json.loads(raw)
-            except Exception:
-                first = raw.find("{")
-                last = raw.rfind("}")
-                if first != -1 and last != -1 and last > first:
-                    sub = raw[first:last+1]
-                    try:
-                        return json.loads(sub)
-                    except Exception:
-                        return None
-            return None
-    except Exception:
-        return None
+from miner_api import send_tcp_json
 
 def execute_terminal_command(miner_name, command, miner_ip, miner_names, miner_ports):
     """اجرای دستور ترمینال برای ماینر مشخص"""